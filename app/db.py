@@ -1,7 +1,10 @@
 import os
+import queue
 import sqlite3
+import threading
+from concurrent.futures import Future
 from contextlib import contextmanager
-from typing import Iterator
+from typing import Any, Callable, Iterable, Iterator
 
 SCHEMA_SQL = """
 CREATE TABLE IF NOT EXISTS downloads (
@@ -59,25 +62,117 @@ CREATE TABLE IF NOT EXISTS download_attempts (
   FOREIGN KEY(download_id) REFERENCES downloads(id) ON DELETE CASCADE
 );
 
+CREATE TABLE IF NOT EXISTS _readyz_probe (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  ts TEXT NOT NULL
+);
+
 CREATE INDEX IF NOT EXISTS idx_downloads_status_created ON downloads(status, created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_downloads_completed_at ON downloads(completed_at DESC);
-CREATE INDEX IF NOT EXISTS idx_downloads_title ON downloads(title);
-CREATE INDEX IF NOT EXISTS idx_downloads_uploader ON downloads(uploader);
+CREATE INDEX IF NOT EXISTS idx_downloads_status_uploader_created ON downloads(status, uploader COLLATE NOCASE, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_downloads_uploader_created ON downloads(uploader COLLATE NOCASE, created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_downloads_video_id ON downloads(video_id);
+CREATE INDEX IF NOT EXISTS idx_downloads_active_url ON downloads(requested_url, preset)
+    WHERE status IN ('queued', 'downloading');
 CREATE INDEX IF NOT EXISTS idx_attempts_download_id ON download_attempts(download_id);
+-- Covers the default gallery page (repository.GALLERY_COLUMNS, newest first) without touching the table.
+CREATE INDEX IF NOT EXISTS idx_downloads_gallery_covering ON downloads(
+  status, created_at DESC, id DESC,
+  media_local_path, title, video_id, requested_url, uploader, thumbnail_local_path, webpage_url
+);
+
+-- Basename of the stored relative path; queries must repeat the exact expression to use the index.
+CREATE INDEX IF NOT EXISTS idx_downloads_media_basename ON downloads(
+  replace(media_local_path, rtrim(media_local_path, replace(media_local_path, '/', '')), '')
+);
+CREATE INDEX IF NOT EXISTS idx_downloads_thumbnail_basename ON downloads(
+  replace(thumbnail_local_path, rtrim(thumbnail_local_path, replace(thumbnail_local_path, '/', '')), '')
+);
+
+-- Superseded by downloads_fts and the uploader composite indexes.
+DROP INDEX IF EXISTS idx_downloads_title;
+DROP INDEX IF EXISTS idx_downloads_uploader;
+"""
+
+FTS_SCHEMA_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS downloads_fts USING fts5(
+  title,
+  uploader,
+  video_id,
+  content='downloads',
+  content_rowid='rowid',
+  tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS downloads_fts_ai AFTER INSERT ON downloads BEGIN
+  INSERT INTO downloads_fts(rowid, title, uploader, video_id)
+  VALUES (new.rowid, new.title, new.uploader, new.video_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS downloads_fts_ad AFTER DELETE ON downloads BEGIN
+  INSERT INTO downloads_fts(downloads_fts, rowid, title, uploader, video_id)
+  VALUES ('delete', old.rowid, old.title, old.uploader, old.video_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS downloads_fts_au AFTER UPDATE OF title, uploader, video_id ON downloads BEGIN
+  INSERT INTO downloads_fts(downloads_fts, rowid, title, uploader, video_id)
+  VALUES ('delete', old.rowid, old.title, old.uploader, old.video_id);
+  INSERT INTO downloads_fts(rowid, title, uploader, video_id)
+  VALUES (new.rowid, new.title, new.uploader, new.video_id);
+END;
 """
 
+STATUS_COUNTS_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS status_counts (
+  status TEXT PRIMARY KEY,
+  cnt INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS downloads_status_counts_ai AFTER INSERT ON downloads BEGIN
+  INSERT INTO status_counts(status, cnt) VALUES (new.status, 1)
+  ON CONFLICT(status) DO UPDATE SET cnt = cnt + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS downloads_status_counts_ad AFTER DELETE ON downloads BEGIN
+  UPDATE status_counts SET cnt = cnt - 1 WHERE status = old.status;
+END;
+
+CREATE TRIGGER IF NOT EXISTS downloads_status_counts_au AFTER UPDATE OF status ON downloads
+WHEN old.status IS NOT new.status BEGIN
+  UPDATE status_counts SET cnt = cnt - 1 WHERE status = old.status;
+  INSERT INTO status_counts(status, cnt) VALUES (new.status, 1)
+  ON CONFLICT(status) DO UPDATE SET cnt = cnt + 1;
+END;
+"""
+
+PROGRESS_UPDATE_SQL = """
+UPDATE downloads
+SET progress_percent = ?,
+    downloaded_bytes = ?,
+    total_bytes = ?,
+    speed_bps = ?,
+    eta_seconds = ?,
+    updated_at = ?
+WHERE id = ?
+"""
+
+# The trigram tokenizer only matches substrings of at least three characters.
+FTS_MIN_QUERY_LENGTH = 3
+
 
 def configure_connection(connection: sqlite3.Connection) -> None:
     connection.row_factory = sqlite3.Row
     connection.execute("PRAGMA journal_mode=WAL;")
     connection.execute("PRAGMA foreign_keys=ON;")
     connection.execute("PRAGMA synchronous=NORMAL;")
+    connection.execute("PRAGMA busy_timeout=30000;")
+    connection.execute("PRAGMA mmap_size=268435456;")
+    connection.execute("PRAGMA cache_size=-20000;")
+    connection.execute("PRAGMA temp_store=MEMORY;")
 
 
 @contextmanager
 def get_connection(sqlite_path: str) -> Iterator[sqlite3.Connection]:
-    os.makedirs(os.path.dirname(sqlite_path), exist_ok=True)
     connection = sqlite3.connect(sqlite_path, timeout=30.0, check_same_thread=False)
     try:
         configure_connection(connection)
@@ -87,6 +182,251 @@ def get_connection(sqlite_path: str) -> Iterator[sqlite3.Connection]:
         connection.close()
 
 
+# Pooled connections live for the whole process, so a larger statement cache keeps every repository query compiled.
+CACHED_STATEMENTS = 512
+
+
+def _make_connection(sqlite_path: str, query_only: bool = False) -> sqlite3.Connection:
+    connection = sqlite3.connect(
+        sqlite_path,
+        timeout=30.0,
+        check_same_thread=False,
+        cached_statements=CACHED_STATEMENTS,
+    )
+    configure_connection(connection)
+    if query_only:
+        connection.execute("PRAGMA query_only=ON;")
+    return connection
+
+
+WriteOp = Callable[[sqlite3.Connection], Any]
+
+# The writer checkpoints the WAL itself once it goes idle, so the inline auto-checkpoint is only a backstop.
+WAL_AUTOCHECKPOINT_PAGES = 10000
+WAL_CHECKPOINT_IDLE_S = 2.0
+
+
+class WriterThread(threading.Thread):
+    def __init__(
+        self,
+        sqlite_path: str,
+        on_commit: Callable[[], None] | None = None,
+        max_batch: int = 64,
+        checkpoint_idle_s: float = WAL_CHECKPOINT_IDLE_S,
+    ):
+        super().__init__(name="sqlite-writer", daemon=True)
+        self.sqlite_path = sqlite_path
+        self.on_commit = on_commit
+        self.max_batch = max(1, max_batch)
+        self.checkpoint_idle_s = checkpoint_idle_s
+        self.q: queue.SimpleQueue[tuple[WriteOp, Future, bool] | None] = queue.SimpleQueue()
+
+    def submit(self, op: WriteOp, rollback: bool = False) -> Future:
+        future: Future = Future()
+        self.q.put((op, future, rollback))
+        return future
+
+    def stop(self) -> None:
+        self.q.put(None)
+
+    def run(self) -> None:
+        connection = _make_connection(self.sqlite_path)
+        connection.isolation_level = None
+        connection.execute(f"PRAGMA wal_autocheckpoint={WAL_AUTOCHECKPOINT_PAGES};")
+        wal_dirty = False
+        try:
+            while True:
+                try:
+                    item = self.q.get(timeout=self.checkpoint_idle_s) if wal_dirty else self.q.get()
+                except queue.Empty:
+                    self._checkpoint(connection)
+                    wal_dirty = False
+                    continue
+                if item is None:
+                    return
+                batch = [item]
+                stopping = False
+                while len(batch) < self.max_batch:
+                    try:
+                        item = self.q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+                for probe in [item for item in batch if item[2]]:
+                    self._run_rolled_back(connection, probe)
+                committed = [item for item in batch if not item[2]]
+                if committed:
+                    self._run_batch(connection, committed)
+                    wal_dirty = True
+                if stopping:
+                    return
+        finally:
+            connection.close()
+
+    def _checkpoint(self, connection: sqlite3.Connection) -> None:
+        # PASSIVE never waits on readers, so an idle checkpoint cannot stall the next write batch.
+        try:
+            connection.execute("PRAGMA wal_checkpoint(PASSIVE);").fetchall()
+        except sqlite3.Error:
+            pass
+
+    def _run_rolled_back(self, connection: sqlite3.Connection, item: tuple[WriteOp, Future, bool]) -> None:
+        # Own transaction, always rolled back: no WAL frames are written and on_commit is not called.
+        op, future, _rollback = item
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = op(connection)
+            finally:
+                connection.execute("ROLLBACK")
+        except BaseException as exc:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+
+    def _run_batch(self, connection: sqlite3.Connection, batch: list[tuple[WriteOp, Future, bool]]) -> None:
+        # Ops share one transaction (one WAL commit); a savepoint per op keeps a failing op from undoing the others.
+        outcomes: list[tuple[Future, Any, BaseException | None]] = []
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            for op, future, _rollback in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                connection.execute("SAVEPOINT write_op")
+                try:
+                    result = op(connection)
+                except BaseException as exc:
+                    connection.execute("ROLLBACK TO write_op")
+                    connection.execute("RELEASE write_op")
+                    outcomes.append((future, None, exc))
+                else:
+                    connection.execute("RELEASE write_op")
+                    outcomes.append((future, result, None))
+            connection.execute("COMMIT")
+            if self.on_commit is not None:
+                self.on_commit()
+        except BaseException as exc:
+            if connection.in_transaction:
+                connection.rollback()
+            for _op, future, _rollback in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        sqlite_path: str,
+        pool_size: int = 4,
+        write_timeout_s: float = 30.0,
+        checkpoint_idle_s: float = WAL_CHECKPOINT_IDLE_S,
+    ):
+        self.sqlite_path = sqlite_path
+        self.write_timeout_s = write_timeout_s
+        self.checkpoint_idle_s = checkpoint_idle_s
+        self._readers: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue(maxsize=max(1, pool_size))
+        self._writer: WriterThread | None = None
+        self._writer_lock = threading.Lock()
+        self.write_generation = 0
+        self._commit_cond = threading.Condition()
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            return _make_connection(self.sqlite_path, query_only=True)
+
+    def _release_reader(self, connection: sqlite3.Connection) -> None:
+        if connection.in_transaction:
+            connection.rollback()
+        try:
+            self._readers.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        connection = self._acquire_reader()
+        try:
+            yield connection
+        finally:
+            self._release_reader(connection)
+
+    def submit_write(self, op: WriteOp, rollback: bool = False) -> Future:
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = WriterThread(
+                    self.sqlite_path,
+                    on_commit=self._bump_generation,
+                    checkpoint_idle_s=self.checkpoint_idle_s,
+                )
+                self._writer.start()
+            return self._writer.submit(op, rollback)
+
+    def _bump_generation(self) -> None:
+        with self._commit_cond:
+            self.write_generation += 1
+            self._commit_cond.notify_all()
+
+    def wait_for_commit(self, seen_generation: int, timeout: float) -> int:
+        # Only sees commits from this process; callers should re-read on timeout as well.
+        with self._commit_cond:
+            self._commit_cond.wait_for(lambda: self.write_generation != seen_generation, timeout=timeout)
+            return self.write_generation
+
+    def write(self, op: WriteOp) -> Any:
+        return self.submit_write(op).result(timeout=self.write_timeout_s)
+
+    def probe_write(self, op: WriteOp) -> Any:
+        # For health checks: proves the writer can modify the database without changing it or waking readers.
+        return self.submit_write(op, rollback=True).result(timeout=self.write_timeout_s)
+
+    def close(self) -> None:
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.stop()
+                self._writer.join(timeout=self.write_timeout_s)
+                self._writer = None
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def batch_update_progress(connection: sqlite3.Connection, rows: Iterable[tuple[Any, ...]]) -> int:
+    # Rows are (progress_percent, downloaded_bytes, total_bytes, speed_bps, eta_seconds, updated_at, id);
+    # the caller's transaction commits them all at once.
+    return connection.executemany(PROGRESS_UPDATE_SQL, rows).rowcount
+
+
 def init_db(sqlite_path: str) -> None:
+    os.makedirs(os.path.dirname(sqlite_path) or ".", exist_ok=True)
     with get_connection(sqlite_path) as connection:
         connection.executescript(SCHEMA_SQL)
+        fts_exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'downloads_fts'"
+        ).fetchone()
+        connection.executescript(FTS_SCHEMA_SQL)
+        if not fts_exists:
+            connection.execute("INSERT INTO downloads_fts(downloads_fts) VALUES ('rebuild')")
+        counts_exist = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'status_counts'"
+        ).fetchone()
+        connection.executescript(STATUS_COUNTS_SCHEMA_SQL)
+        if not counts_exist:
+            connection.execute(
+                "INSERT INTO status_counts(status, cnt) SELECT status, COUNT(*) FROM downloads GROUP BY status"
+            )
@@ -1,12 +1,18 @@
+import atexit
 import json
 import logging
+import queue
 import sys
+import time
 from datetime import datetime, timezone
-from typing import Any
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, TextIO
+
+import orjson
 
 
 class JsonFormatter(logging.Formatter):
-    RESERVED = {
+    RESERVED = frozenset({
         "name",
         "msg",
         "args",
@@ -28,33 +34,131 @@ class JsonFormatter(logging.Formatter):
         "processName",
         "process",
         "message",
-    }
+    })
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._ts_cache: tuple[int, str] = (-1, "")
+
+    def _format_ts(self, created: float) -> str:
+        second = int(created)
+        cached_second, prefix = self._ts_cache
+        if cached_second != second:
+            prefix = datetime.fromtimestamp(second, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+            self._ts_cache = (second, prefix)
+        return f"{prefix}.{int((created - second) * 1_000_000):06d}+00:00"
 
     def format(self, record: logging.LogRecord) -> str:
         payload: dict[str, Any] = {
-            "ts": datetime.now(timezone.utc).isoformat(),
+            "ts": self._format_ts(record.created),
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
         }
 
-        for key, value in record.__dict__.items():
-            if key in self.RESERVED or key.startswith("_"):
-                continue
-            payload[key] = value
+        attributes = record.__dict__
+        for key in sorted(attributes.keys() - self.RESERVED):
+            if not key.startswith("_"):
+                payload[key] = attributes[key]
 
         if record.exc_info:
             payload["exception"] = self.formatException(record.exc_info)
 
-        return json.dumps(payload, ensure_ascii=True)
+        try:
+            return orjson.dumps(payload, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            # e.g. integers beyond 64 bits, which orjson refuses even with default=.
+            return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class BufferedStreamHandler(logging.Handler):
+    def __init__(self, stream: TextIO, flush_every: int = 64, flush_interval_s: float = 0.05):
+        super().__init__()
+        self.stream = stream
+        self.flush_every = max(1, flush_every)
+        self.flush_interval_s = flush_interval_s
+        self._buffer: list[str] = []
+        self._last_flush = time.monotonic()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._buffer.append(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self._buffer) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval_s:
+            self.flush()
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if self._buffer:
+                self.stream.write("".join(self._buffer))
+            self.stream.flush()
+        except (OSError, ValueError):
+            # The stream went away (closed stdout, broken pipe); drop the batch like StreamHandler would.
+            pass
+        finally:
+            self._buffer.clear()
+            self._last_flush = time.monotonic()
+            self.release()
+
+
+class _InProcessQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Records never leave the process, so keep exc_info and extras intact for JsonFormatter.
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _BatchingQueueListener(QueueListener):
+    def __init__(self, log_queue: queue.SimpleQueue, handler: BufferedStreamHandler):
+        super().__init__(log_queue, handler, respect_handler_level=True)
+        self.flush_interval_s = handler.flush_interval_s
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        if not block:
+            return self.queue.get(block=False)
+        try:
+            return self.queue.get(timeout=self.flush_interval_s)
+        except queue.Empty:
+            for handler in self.handlers:
+                handler.flush()
+            return self.queue.get()
+
+    def stop(self) -> None:
+        super().stop()
+        for handler in self.handlers:
+            handler.flush()
+
+
+_listener: _BatchingQueueListener | None = None
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 
 def configure_logging(level: str = "INFO") -> None:
+    global _listener
     root = logging.getLogger()
     root.setLevel(level.upper())
 
-    handler = logging.StreamHandler(sys.stdout)
+    _stop_listener()
+
+    handler = BufferedStreamHandler(sys.stdout)
     handler.setFormatter(JsonFormatter())
 
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _listener = _BatchingQueueListener(log_queue, handler)
+    _listener.start()
+
     root.handlers.clear()
-    root.addHandler(handler)
+    root.addHandler(_InProcessQueueHandler(log_queue))
+
+
+atexit.register(_stop_listener)
@@ -1,41 +1,77 @@
 import atexit
+import base64
 import logging
 import os
+import posixpath
+import re
 import shutil
+import stat
+import threading
+import time
 import uuid
-from urllib.parse import unquote
+from functools import lru_cache
+from urllib.parse import quote, unquote
 
-from flask import Flask, abort, g, jsonify, render_template, request, send_from_directory
+import orjson
+from flask import Flask, Response, abort, g, jsonify, render_template, request, send_file
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
 from yt_dlp import YoutubeDL, version as yt_dlp_version
 
 from .logging_config import configure_logging
 from .metrics import MetricsRecorder, metrics_response
 from .queue_manager import PRESET_CONFIG, QueueManager, build_runtime_diagnostics
-from .repository import DownloadRepository
+from .repository import GALLERY_COLUMNS, KEYSET_SORTS, DownloadRepository
 
 LOGGER = logging.getLogger(__name__)
 
+_URL_SCHEMES = ("http://", "https://")
+_SCHEME_FIX = re.compile(r"^(https?):/(?!/)")
 
-def _normalize_external_url(raw: str) -> str | None:
+GALLERY_CACHE_MAX_ENTRIES = 128
+
+# Each open stream holds a server thread (gunicorn gthread), so streams are capped in number and lifetime;
+# clients over the cap get 429 and poll /api/status instead.
+STATUS_STREAM_MAX_SECONDS = 120
+STATUS_STREAM_KEEPALIVE_SECONDS = 15
+TERMINAL_STATUSES = frozenset({"completed", "failed"})
+
+_PRESET_OPTIONS_TEMPLATE = (
+    "{% for preset_id, cfg in presets.items() %}"
+    '<option value="{{ preset_id }}" {% if preset_id == default_preset %}selected{% endif %}>{{ cfg.label }}</option>'
+    "{% endfor %}"
+)
+
+_PRESETS_BODY = orjson.dumps(
+    {
+        "ok": True,
+        "presets": [{"id": preset_id, "label": cfg["label"]} for preset_id, cfg in PRESET_CONFIG.items()],
+        "default": "best",
+    }
+)
+
+
+def _str_arg(name: str, default: str = "") -> str:
+    return (request.args.get(name) or default).strip()
+
+
+@lru_cache(maxsize=1024)
+def _repair_external_path(raw: str) -> str:
+    # Proxies and browsers collapse "//" in paths, so "/https:/host" must be repaired.
+    return _SCHEME_FIX.sub(r"\1://", unquote(raw), count=1)
+
+
+def _normalize_external_url(raw: str, qs: str) -> str | None:
     if not raw:
         return None
-    url = unquote(raw)
-    qs = request.query_string.decode("utf-8")
+    url = _repair_external_path(raw)
     if qs:
         url = url + ("&" if "?" in url else "?") + qs
-
-    if url.startswith("http:/") and not url.startswith("http://"):
-        url = url.replace("http:/", "http://", 1)
-    if url.startswith("https:/") and not url.startswith("https://"):
-        url = url.replace("https:/", "https://", 1)
-
-    if url.startswith("http://") or url.startswith("https://"):
-        return url
-    return None
+    return url if _is_valid_url(url) else None
 
 
 def _is_valid_url(url: str) -> bool:
-    return url.startswith("http://") or url.startswith("https://")
+    return url.startswith(_URL_SCHEMES)
 
 
 def _parse_positive_int(value: str | None, default: int, minimum: int, maximum: int) -> int:
@@ -46,13 +82,27 @@ def _parse_positive_int(value: str | None, default: int, minimum: int, maximum:
     return max(minimum, min(maximum, parsed))
 
 
-def _safe_relative_path(base_dir: str, relative_path: str) -> str | None:
-    normalized = relative_path.replace("\\", "/").lstrip("/")
-    full = os.path.realpath(os.path.join(base_dir, normalized))
-    base = os.path.realpath(base_dir)
-    if os.path.commonpath([full, base]) != base:
+def _encode_cursor(created_at: str, download_id: str) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps([created_at, download_id])).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str] | None:
+    try:
+        value = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, orjson.JSONDecodeError):
+        return None
+    if not (isinstance(value, list) and len(value) == 2 and all(isinstance(part, str) for part in value)):
         return None
-    return os.path.relpath(full, base)
+    return value[0], value[1]
+
+
+def _safe_relative_path(relative_path: str) -> str | None:
+    if "\0" in relative_path:
+        return None
+    normalized = posixpath.normpath(relative_path.replace("\\", "/").lstrip("/"))
+    if normalized == ".." or normalized.startswith("../"):
+        return None
+    return normalized
 
 
 def create_app(config: dict | None = None) -> Flask:
@@ -68,6 +118,12 @@ def create_app(config: dict | None = None) -> Flask:
         MAX_CONCURRENT_DOWNLOADS=int(os.environ.get("MAX_CONCURRENT_DOWNLOADS", 4)),
         MIN_FREE_DISK_MB=int(os.environ.get("MIN_FREE_DISK_MB", 512)),
         JOB_PROGRESS_FLUSH_INTERVAL_MS=int(os.environ.get("JOB_PROGRESS_FLUSH_INTERVAL_MS", 750)),
+        JINJA_BYTECODE_CACHE_DIR=os.environ.get("JINJA_BYTECODE_CACHE_DIR", "").strip(),
+        SQLITE_READ_POOL_SIZE=int(os.environ.get("SQLITE_READ_POOL_SIZE", 4)),
+        FILES_X_ACCEL_REDIRECT_PREFIX=os.environ.get("FILES_X_ACCEL_REDIRECT_PREFIX", "").strip(),
+        USE_X_SENDFILE=os.environ.get("USE_X_SENDFILE", "0").strip().lower() in {"1", "true", "yes", "on"},
+        METRICS_CACHE_TTL_MS=int(os.environ.get("METRICS_CACHE_TTL_MS", 500)),
+        STATUS_STREAM_MAX_CONNECTIONS=int(os.environ.get("STATUS_STREAM_MAX_CONNECTIONS", 2)),
         START_QUEUE_MANAGER=True,
     )
 
@@ -76,11 +132,20 @@ def create_app(config: dict | None = None) -> Flask:
 
     os.makedirs(app.config["BASE_DOWNLOAD_DIR"], exist_ok=True)
 
-    repo = DownloadRepository(app.config["SQLITE_PATH"])
+    # The cache unmarshals code objects, so it is opt-in and must point at a directory only this user can write.
+    if app.config["JINJA_BYTECODE_CACHE_DIR"]:
+        os.makedirs(app.config["JINJA_BYTECODE_CACHE_DIR"], mode=0o700, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config["JINJA_BYTECODE_CACHE_DIR"])
+    preset_options_html = Markup(
+        app.jinja_env.from_string(_PRESET_OPTIONS_TEMPLATE).render(presets=PRESET_CONFIG, default_preset="best")
+    )
+    app.config["BASE_DOWNLOAD_DIR_REAL"] = os.path.realpath(app.config["BASE_DOWNLOAD_DIR"])
+
+    repo = DownloadRepository(app.config["SQLITE_PATH"], pool_size=app.config["SQLITE_READ_POOL_SIZE"])
     repo.init()
     recovered = repo.recover_interrupted_downloads()
 
-    metrics = MetricsRecorder()
+    metrics = MetricsRecorder(scrape_cache_ttl_s=app.config["METRICS_CACHE_TTL_MS"] / 1000.0)
     queue_manager = QueueManager(
         repo=repo,
         metrics=metrics,
@@ -112,11 +177,12 @@ def create_app(config: dict | None = None) -> Flask:
     @atexit.register
     def _shutdown_queue_manager() -> None:
         queue_manager.stop()
+        repo.close()
 
     @app.before_request
     def _before_request() -> None:
         g.request_started_at = metrics.http_before_request()
-        g.request_id = str(uuid.uuid4())
+        g.request_id = uuid.uuid4().hex
 
     @app.after_request
     def _after_request(response):
@@ -124,6 +190,8 @@ def create_app(config: dict | None = None) -> Flask:
         if started is not None:
             metrics.http_after_request(started, response.status_code)
         response.headers["X-Request-ID"] = getattr(g, "request_id", "")
+        if request.endpoint == "health":
+            return response
         LOGGER.info(
             "http_request",
             extra={
@@ -137,31 +205,37 @@ def create_app(config: dict | None = None) -> Flask:
         return response
 
     def _enqueue_download(url: str, preset: str) -> dict:
-        download_id = str(uuid.uuid4())
-        record = repo.create_download(download_id, url, preset)
+        download_id = uuid.uuid4().hex
+        record, created = repo.create_or_get_active_download(download_id, url, preset)
+        if not created:
+            LOGGER.info("job_deduplicated", extra={"job_id": record.get("id"), "preset": preset, "url": url})
+            return record
         metrics.mark_queued(preset)
         LOGGER.info("job_queued", extra={"job_id": download_id, "preset": preset, "url": url})
+        queue_manager.wake()
         return record
 
-    @app.route("/", methods=["GET"])
-    def index():
-        url = (request.args.get("u") or "").strip()
-        return render_template(
-            "index.html",
-            url=url,
-            preset_options=PRESET_CONFIG,
-            default_preset="best",
-        )
+    # Gallery pages keyed by query params, valid while repo.storage_version() is unchanged.
+    gallery_cache: dict[tuple, tuple[tuple[int, ...], list[dict], int]] = {}
+    gallery_cache_lock = threading.Lock()
+    stream_slots = threading.BoundedSemaphore(max(1, app.config["STATUS_STREAM_MAX_CONNECTIONS"]))
 
-    @app.route("/gallery", methods=["GET"])
-    def gallery():
-        page = _parse_positive_int(request.args.get("page"), 1, 1, 100000)
-        per_page = _parse_positive_int(request.args.get("per_page"), 24, 1, 100)
-        q = (request.args.get("q") or "").strip() or None
-        sort = (request.args.get("sort") or "created_desc").strip()
-        uploader = (request.args.get("uploader") or "").strip() or None
-        status = (request.args.get("status") or "completed").strip() or None
+    def _render_index(**context):
+        return render_template("index.html", preset_options_html=preset_options_html, **context)
 
+    @app.route("/", methods=["GET"])
+    def index():
+        url = _str_arg("u")
+        return _render_index(url=url)
+
+    def _load_gallery_page(
+        page: int,
+        per_page: int,
+        q: str | None,
+        sort: str,
+        uploader: str | None,
+        status: str | None,
+    ) -> tuple[list[dict], int]:
         rows, total = repo.list_downloads(
             page=page,
             per_page=per_page,
@@ -169,24 +243,46 @@ def create_app(config: dict | None = None) -> Flask:
             q=q,
             sort=sort,
             uploader=uploader,
+            columns=GALLERY_COLUMNS,
         )
 
-        videos = []
-        for row in rows:
-            media_path = row.get("media_local_path")
-            videos.append(
-                {
-                    "id": row.get("id"),
-                    "filename": os.path.basename(media_path) if media_path else None,
-                    "media_local_path": media_path,
-                    "title": row.get("title") or row.get("video_id") or row.get("requested_url"),
-                    "uploader": row.get("uploader") or "Unknown",
-                    "thumbnail": row.get("thumbnail_local_path"),
-                    "original_url": row.get("webpage_url") or row.get("requested_url"),
-                    "status": row.get("status"),
-                    "created_at": row.get("created_at"),
-                }
-            )
+        videos = [
+            {
+                "id": row["id"],
+                "filename": os.path.basename(row["media_local_path"]) if row["media_local_path"] else None,
+                "media_local_path": row["media_local_path"],
+                "title": row["title"] or row["video_id"] or row["requested_url"],
+                "uploader": row["uploader"] or "Unknown",
+                "thumbnail": row["thumbnail_local_path"],
+                "original_url": row["webpage_url"] or row["requested_url"],
+                "status": row["status"],
+                "created_at": row["created_at"],
+            }
+            for row in rows
+        ]
+        return videos, total
+
+    @app.route("/gallery", methods=["GET"])
+    def gallery():
+        page = _parse_positive_int(request.args.get("page"), 1, 1, 100000)
+        per_page = _parse_positive_int(request.args.get("per_page"), 24, 1, 100)
+        q = _str_arg("q") or None
+        sort = _str_arg("sort", "created_desc")
+        uploader = _str_arg("uploader") or None
+        status = _str_arg("status", "completed") or None
+
+        cache_key = (page, per_page, q, sort, uploader, status)
+        version = repo.storage_version()
+        with gallery_cache_lock:
+            cached = gallery_cache.get(cache_key)
+        if cached and cached[0] == version:
+            _version, videos, total = cached
+        else:
+            videos, total = _load_gallery_page(*cache_key)
+            with gallery_cache_lock:
+                if len(gallery_cache) >= GALLERY_CACHE_MAX_ENTRIES:
+                    gallery_cache.clear()
+                gallery_cache[cache_key] = (version, videos, total)
 
         pages = (total + per_page - 1) // per_page if per_page else 1
 
@@ -205,15 +301,29 @@ def create_app(config: dict | None = None) -> Flask:
 
     @app.route("/files/<path:filename>")
     def serve_file(filename: str):
-        safe_rel = _safe_relative_path(app.config["BASE_DOWNLOAD_DIR"], filename)
+        safe_rel = _safe_relative_path(filename)
         if not safe_rel:
             abort(403)
 
-        full = os.path.realpath(os.path.join(app.config["BASE_DOWNLOAD_DIR"], safe_rel))
-        if not os.path.isfile(full):
+        base_real = app.config["BASE_DOWNLOAD_DIR_REAL"]
+        full = os.path.realpath(os.path.join(base_real, safe_rel))
+        if full != base_real and not full.startswith(base_real + os.sep):
+            abort(403)
+        try:
+            if not stat.S_ISREG(os.stat(full).st_mode):
+                abort(404)
+        except OSError:
             abort(404)
 
-        return send_from_directory(app.config["BASE_DOWNLOAD_DIR"], safe_rel)
+        accel_prefix = app.config["FILES_X_ACCEL_REDIRECT_PREFIX"]
+        if accel_prefix:
+            response = Response(status=200)
+            response.headers["X-Accel-Redirect"] = accel_prefix.rstrip("/") + "/" + quote(safe_rel)
+            response.headers["Content-Type"] = ""
+            return response
+
+        # full is the realpath checked above; send_file stats it once more and honors USE_X_SENDFILE.
+        return send_file(full, conditional=True, etag=True)
 
     @app.route("/download", methods=["POST"])
     def download_route():
@@ -245,14 +355,58 @@ def create_app(config: dict | None = None) -> Flask:
             return jsonify({"ok": False, "error": "Job nicht gefunden"}), 404
         return jsonify({"ok": True, "job": job})
 
+    @app.route("/api/status/<job_id>/stream", methods=["GET"])
+    def stream_job_status(job_id: str):
+        if not repo.get_download(job_id, with_metadata=False):
+            return jsonify({"ok": False, "error": "Job nicht gefunden"}), 404
+        if not stream_slots.acquire(blocking=False):
+            response = jsonify({"ok": False, "error": "stream_limit", "poll": f"/api/status/{job_id}"})
+            response.status_code = 429
+            response.headers["Retry-After"] = "5"
+            return response
+
+        def _events():
+            deadline = time.monotonic() + STATUS_STREAM_MAX_SECONDS
+            generation = repo.pool.write_generation
+            last_sent = None
+            last_event_at = 0.0
+            while time.monotonic() < deadline:
+                # Progress flushes wake every stream; only rows that changed are re-read with parsed metadata.
+                job = repo.get_download(job_id, with_metadata=False)
+                if job is not None and (job.get("status"), job.get("updated_at")) != last_sent:
+                    job = repo.get_download(job_id)
+                if job is None:
+                    yield "event: deleted\ndata: {}\n\n"
+                    return
+                marker = (job.get("status"), job.get("updated_at"))
+                if marker != last_sent:
+                    last_sent = marker
+                    last_event_at = time.monotonic()
+                    yield "data: " + orjson.dumps({"ok": True, "job": job}, default=str).decode("utf-8") + "\n\n"
+                    if job.get("status") in TERMINAL_STATUSES:
+                        return
+                elif time.monotonic() - last_event_at >= STATUS_STREAM_KEEPALIVE_SECONDS:
+                    last_event_at = time.monotonic()
+                    yield ": keepalive\n\n"
+                generation = repo.pool.wait_for_commit(generation, timeout=1.0)
+
+        response = Response(_events(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+        response.call_on_close(stream_slots.release)
+        return response
+
     @app.route("/api/jobs", methods=["GET"])
     def list_jobs():
         page = _parse_positive_int(request.args.get("page"), 1, 1, 100000)
         per_page = _parse_positive_int(request.args.get("per_page"), 20, 1, 100)
-        status = (request.args.get("status") or "").strip() or None
-        q = (request.args.get("q") or "").strip() or None
-        sort = (request.args.get("sort") or "created_desc").strip()
-        uploader = (request.args.get("uploader") or "").strip() or None
+        status = _str_arg("status") or None
+        q = _str_arg("q") or None
+        sort = _str_arg("sort", "created_desc")
+        uploader = _str_arg("uploader") or None
+        cursor = _str_arg("cursor")
+        after = _decode_cursor(cursor) if cursor else None
+        if cursor and after is None:
+            return jsonify({"ok": False, "error": "invalid_cursor"}), 400
+        with_metadata = _str_arg("metadata", "1").lower() not in {"0", "false", "no", "off"}
 
         items, total = repo.list_downloads(
             page=page,
@@ -261,8 +415,14 @@ def create_app(config: dict | None = None) -> Flask:
             q=q,
             sort=sort,
             uploader=uploader,
+            after=after,
+            with_metadata=with_metadata,
         )
 
+        next_cursor = None
+        if sort in KEYSET_SORTS and len(items) == per_page:
+            next_cursor = _encode_cursor(items[-1]["created_at"], items[-1]["id"])
+
         pages = (total + per_page - 1) // per_page if per_page else 1
         return jsonify(
             {
@@ -272,6 +432,7 @@ def create_app(config: dict | None = None) -> Flask:
                 "per_page": per_page,
                 "pages": pages,
                 "total": total,
+                "next_cursor": next_cursor,
             }
         )
 
@@ -279,7 +440,7 @@ def create_app(config: dict | None = None) -> Flask:
     def pause_job(job_id: str):
         ok, state = queue_manager.pause_job(job_id)
         if not ok:
-            if not repo.get_download(job_id):
+            if not repo.get_download(job_id, with_metadata=False):
                 return jsonify({"ok": False, "error": "not_found"}), 404
             return jsonify({"ok": False, "error": state}), 409
         job = repo.get_download(job_id)
@@ -289,7 +450,7 @@ def create_app(config: dict | None = None) -> Flask:
     def resume_job(job_id: str):
         ok, state = queue_manager.resume_job(job_id)
         if not ok:
-            if not repo.get_download(job_id):
+            if not repo.get_download(job_id, with_metadata=False):
                 return jsonify({"ok": False, "error": "not_found"}), 404
             return jsonify({"ok": False, "error": state}), 409
         job = repo.get_download(job_id)
@@ -299,7 +460,7 @@ def create_app(config: dict | None = None) -> Flask:
     def retry_job(job_id: str):
         ok, state = queue_manager.retry_job(job_id)
         if not ok:
-            if not repo.get_download(job_id):
+            if not repo.get_download(job_id, with_metadata=False):
                 return jsonify({"ok": False, "error": "not_found"}), 404
             return jsonify({"ok": False, "error": state}), 409
         job = repo.get_download(job_id)
@@ -339,20 +500,11 @@ def create_app(config: dict | None = None) -> Flask:
 
     @app.route("/api/presets", methods=["GET"])
     def presets():
-        return jsonify(
-            {
-                "ok": True,
-                "presets": [
-                    {"id": preset_id, "label": cfg["label"]}
-                    for preset_id, cfg in PRESET_CONFIG.items()
-                ],
-                "default": "best",
-            }
-        )
+        return Response(_PRESETS_BODY, mimetype="application/json")
 
     @app.route("/api/probe", methods=["GET"])
     def api_probe():
-        url = (request.args.get("u") or "").strip()
+        url = _str_arg("u")
         if not _is_valid_url(url):
             return jsonify({"ok": False, "error": "invalid_url"}), 400
 
@@ -374,7 +526,7 @@ def create_app(config: dict | None = None) -> Flask:
 
     @app.route("/metrics", methods=["GET"])
     def metrics_endpoint():
-        return metrics_response()
+        return metrics_response(metrics)
 
     @app.route("/readyz", methods=["GET"])
     def readyz():
@@ -410,34 +562,27 @@ def create_app(config: dict | None = None) -> Flask:
 
     @app.route("/healthz", methods=["GET"])
     def health():
-        return "ok", 200
-
-    @app.route("/<path:raw>", methods=["GET"])
-    def catch_all(raw: str):
-        if raw.startswith(("api/", "download", "healthz", "static/", "metrics", "readyz", "gallery", "files/")):
-            return render_template("index.html", error="Pfad nicht gefunden.", url="", preset_options=PRESET_CONFIG, default_preset="best"), 404
-
-        candidate = _normalize_external_url(raw)
+        return Response(b"ok", mimetype="text/plain")
+
+    @app.errorhandler(404)
+    def not_found(_error):
+        if request.path.startswith("/api/"):
+            return jsonify({"ok": False, "error": "not_found"}), 404
+        return _render_index(error="Pfad nicht gefunden.", url=""), 404
+
+    # Only paths that look like "/http..." are treated as URLs to enqueue; anything else falls through to 404.
+    @app.route("/http<path:rest>", methods=["GET"])
+    def catch_all(rest: str):
+        raw = "http" + rest
+        candidate = _normalize_external_url(raw, request.query_string.decode("utf-8"))
         if not candidate:
-            return (
-                render_template(
-                    "index.html",
-                    error="Ungültige URL.",
-                    url=raw,
-                    preset_options=PRESET_CONFIG,
-                    default_preset="best",
-                ),
-                400,
-            )
+            return _render_index(error="Ungültige URL.", url=raw), 400
 
         record = _enqueue_download(candidate, "best")
-        return render_template(
-            "index.html",
+        return _render_index(
             url=candidate,
             job_id=record.get("id"),
             feedback="✅ Download gestartet (läuft im Hintergrund).",
-            preset_options=PRESET_CONFIG,
-            default_preset="best",
         )
 
     return app
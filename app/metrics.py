@@ -1,3 +1,4 @@
+import threading
 import time
 from typing import Any
 
@@ -51,10 +52,12 @@ DOWNLOADER_QUEUE_DEPTH = Gauge(
     "downloader_queue_depth",
     "Queued download items",
 )
+# Downloads run from seconds to hours; the default buckets top out at 10s.
 DOWNLOADER_JOB_DURATION_SECONDS = Histogram(
     "downloader_job_duration_seconds",
     "Download processing duration",
     ["preset", "status"],
+    buckets=(1, 5, 15, 60, 300, 1800, 7200),
 )
 DOWNLOADER_DOWNLOADED_BYTES_TOTAL = Counter(
     "downloader_downloaded_bytes_total",
@@ -62,29 +65,51 @@ DOWNLOADER_DOWNLOADED_BYTES_TOTAL = Counter(
 )
 
 
+def _child(cache: dict[tuple[str, ...], Any], metric: Any, *labels: str) -> Any:
+    # Label children are bound once per label tuple; labels() re-validates and hashes on every call.
+    child = cache.get(labels)
+    if child is None:
+        child = cache.setdefault(labels, metric.labels(*labels))
+    return child
+
+
 class MetricsRecorder:
+    def __init__(self, scrape_cache_ttl_s: float = 0.5) -> None:
+        self.scrape_cache_ttl_s = max(0.0, scrape_cache_ttl_s)
+        self._scrape_cache: tuple[float, bytes] | None = None
+        self._scrape_lock = threading.Lock()
+        self._http_requests: dict[tuple[str, ...], Any] = {}
+        self._http_durations: dict[tuple[str, ...], Any] = {}
+        self._queued: dict[tuple[str, ...], Any] = {}
+        self._started: dict[tuple[str, ...], Any] = {}
+        self._completed: dict[tuple[str, ...], Any] = {}
+        self._failed: dict[tuple[str, ...], Any] = {}
+        self._durations: dict[tuple[str, ...], Any] = {}
+
     def http_before_request(self) -> float:
         return time.perf_counter()
 
     def http_after_request(self, started: float, response_status: int) -> None:
         elapsed = max(0.0, time.perf_counter() - started)
-        route = request.url_rule.rule if request.url_rule else "unknown"
-        method = request.method
-        status = str(response_status)
-        HTTP_REQUESTS_TOTAL.labels(method=method, route=route, status=status).inc()
-        HTTP_REQUEST_DURATION_SECONDS.labels(method=method, route=route).observe(elapsed)
+        # Resolve the request proxy once; every attribute access on it goes through a context lookup.
+        req = request._get_current_object()
+        rule = req.url_rule
+        route = rule.rule if rule is not None else "unknown"
+        method = req.method
+        _child(self._http_requests, HTTP_REQUESTS_TOTAL, method, route, str(response_status)).inc()
+        _child(self._http_durations, HTTP_REQUEST_DURATION_SECONDS, method, route).observe(elapsed)
 
     def mark_queued(self, preset: str) -> None:
-        DOWNLOADER_JOBS_QUEUED_TOTAL.labels(preset=preset).inc()
+        _child(self._queued, DOWNLOADER_JOBS_QUEUED_TOTAL, preset).inc()
 
     def mark_started(self, preset: str) -> None:
-        DOWNLOADER_JOBS_STARTED_TOTAL.labels(preset=preset).inc()
+        _child(self._started, DOWNLOADER_JOBS_STARTED_TOTAL, preset).inc()
 
     def mark_completed(self, preset: str) -> None:
-        DOWNLOADER_JOBS_COMPLETED_TOTAL.labels(preset=preset).inc()
+        _child(self._completed, DOWNLOADER_JOBS_COMPLETED_TOTAL, preset).inc()
 
     def mark_failed(self, reason: str) -> None:
-        DOWNLOADER_JOBS_FAILED_TOTAL.labels(reason=reason or "unknown").inc()
+        _child(self._failed, DOWNLOADER_JOBS_FAILED_TOTAL, reason or "unknown").inc()
 
     def mark_paused(self) -> None:
         DOWNLOADER_JOBS_PAUSED_TOTAL.inc()
@@ -99,12 +124,25 @@ class MetricsRecorder:
         DOWNLOADER_QUEUE_DEPTH.set(max(0, value))
 
     def observe_duration(self, preset: str, status: str, seconds: float) -> None:
-        DOWNLOADER_JOB_DURATION_SECONDS.labels(preset=preset, status=status).observe(max(0.0, seconds))
+        _child(self._durations, DOWNLOADER_JOB_DURATION_SECONDS, preset, status).observe(max(0.0, seconds))
 
     def add_downloaded_bytes(self, value: int) -> None:
         if value > 0:
             DOWNLOADER_DOWNLOADED_BYTES_TOTAL.inc(value)
 
-
-def metrics_response() -> Response:
-    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+    def render(self) -> bytes:
+        cached = self._scrape_cache
+        if cached and time.monotonic() - cached[0] < self.scrape_cache_ttl_s:
+            return cached[1]
+        with self._scrape_lock:
+            cached = self._scrape_cache
+            if cached and time.monotonic() - cached[0] < self.scrape_cache_ttl_s:
+                return cached[1]
+            body = generate_latest()
+            self._scrape_cache = (time.monotonic(), body)
+            return body
+
+
+def metrics_response(recorder: MetricsRecorder | None = None) -> Response:
+    body = recorder.render() if recorder else generate_latest()
+    return Response(body, mimetype=CONTENT_TYPE_LATEST)
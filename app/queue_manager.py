@@ -1,10 +1,12 @@
-import glob
 import logging
 import os
+import random
+import re
 import shutil
 import threading
 import time
 from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from typing import Any
 from urllib.parse import urlparse
 
@@ -16,6 +18,11 @@ from .repository import DownloadRepository
 
 LOGGER = logging.getLogger(__name__)
 
+SCHEDULER_IDLE_INTERVAL_S = 5.0
+
+SIDECAR_SUFFIXES = (".info.json", ".jpg", ".webp", ".png")
+NON_MEDIA_SUFFIXES = frozenset({".json", ".part", ".ytdl", ".tmp", ".jpg", ".webp", ".png"})
+
 PRESET_CONFIG: dict[str, dict[str, Any]] = {
     "best": {
         "label": "Best",
@@ -40,6 +47,16 @@ RETRYABLE_ERROR_TOKENS = (
     "missing a url",
     "unable to download video data",
 )
+_RETRYABLE_ERROR_RE = re.compile("|".join(re.escape(token) for token in RETRYABLE_ERROR_TOKENS), re.IGNORECASE)
+
+FAILURE_REASON_TOKENS = {
+    "403": "forbidden",
+    "forbidden": "forbidden",
+    "network": "network",
+    "not available": "unavailable",
+}
+FAILURE_REASON_PRIORITY = ("forbidden", "network", "unavailable")
+_FAILURE_REASON_RE = re.compile("|".join(re.escape(token) for token in FAILURE_REASON_TOKENS), re.IGNORECASE)
 
 
 class PauseRequestedError(Exception):
@@ -58,22 +75,45 @@ class QueueManager:
         self.repo = repo
         self.metrics = metrics
         self.base_download_dir = base_download_dir
+        self._base_real = os.path.realpath(base_download_dir)
+        self._base_real_prefix = os.path.join(self._base_real, "")
         self.max_concurrent_downloads = max(1, max_concurrent_downloads)
         self.progress_flush_interval_s = max(0.1, progress_flush_interval_ms / 1000.0)
 
         self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent_downloads)
+        # Copy-on-write: writers rebind _active under _active_lock, readers use whatever snapshot they see.
         self._active: dict[str, dict[str, Any]] = {}
         self._active_lock = threading.Lock()
         self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        # Set whenever the number of queued rows may have changed; _sync_metrics only recounts then.
+        self._queue_dirty = True
         self._scheduler_thread: threading.Thread | None = None
+        # Latest progress row per job; the flusher writes them all in one batch (last writer wins).
+        self._pending_progress: dict[str, tuple[float | None, int, int | None, float | None, int | None, str]] = {}
+        self._pending_progress_lock = threading.Lock()
+        self._progress_flush_lock = threading.Lock()
+        self._progress_thread: threading.Thread | None = None
 
         self.ytdlp_js_runtime = os.environ.get("YTDLP_JS_RUNTIME", "node").strip()
         self.ytdlp_js_runtime_path = os.environ.get("YTDLP_JS_RUNTIME_PATH", "/usr/bin/node").strip()
         self.ytdlp_ffmpeg_path = os.environ.get("YTDLP_FFMPEG_PATH", "").strip()
+        self.ytdlp_fragment_concurrency = max(1, int(os.environ.get("YTDLP_FRAGMENT_CONCURRENCY", 16)))
+        self.ytdlp_http_chunk_size = max(0, int(os.environ.get("YTDLP_HTTP_CHUNK_SIZE", 10 * 1024 * 1024)))
+        self.ytdlp_buffer_size = max(1024, int(os.environ.get("YTDLP_BUFFER_SIZE", 64 * 1024)))
+        self.retry_base_s = max(0.0, float(os.environ.get("YTDLP_RETRY_BASE", 1.0)))
+        self.retry_max_s = max(0.0, float(os.environ.get("YTDLP_RETRY_MAX", 30.0)))
         self.ytdlp_enable_youtube_fallback = (
             os.environ.get("YTDLP_ENABLE_YOUTUBE_FALLBACK", "1").strip().lower()
             in {"1", "true", "yes", "on"}
         )
+        self.persist_metadata = os.environ.get("PERSIST_METADATA", "1").strip().lower() in {"1", "true", "yes", "on"}
+        self._ydl_option_templates = {
+            (preset, runtime_profile, is_youtube): self._build_ydl_option_template(preset, runtime_profile, is_youtube)
+            for preset in PRESET_CONFIG
+            for runtime_profile in ("primary", "fallback")
+            for is_youtube in (False, True)
+        }
 
     def start(self) -> None:
         if self._scheduler_thread and self._scheduler_thread.is_alive():
@@ -81,62 +121,111 @@ class QueueManager:
         self._stop_event.clear()
         self._scheduler_thread = threading.Thread(target=self._scheduler_loop, daemon=True)
         self._scheduler_thread.start()
+        self._progress_thread = threading.Thread(target=self._progress_loop, daemon=True)
+        self._progress_thread.start()
 
     def stop(self) -> None:
         self._stop_event.set()
+        self._wake_event.set()
         if self._scheduler_thread:
             self._scheduler_thread.join(timeout=2)
+        if self._progress_thread:
+            self._progress_thread.join(timeout=2)
+        self.flush_progress()
         self.executor.shutdown(wait=False, cancel_futures=False)
 
+    def _progress_loop(self) -> None:
+        while not self._stop_event.wait(self.progress_flush_interval_s):
+            try:
+                self.flush_progress()
+            except Exception:
+                LOGGER.exception("progress_flush_failed")
+
+    def _queue_progress(
+        self,
+        job_id: str,
+        percent: float | None,
+        downloaded: int,
+        total: int | None,
+        speed: float | None,
+        eta: int | None,
+    ) -> None:
+        with self._pending_progress_lock:
+            self._pending_progress[job_id] = (percent, downloaded, total, speed, eta, job_id)
+
+    def flush_progress(self) -> int:
+        # Held across the write so a caller returning from here knows every earlier tick is committed.
+        with self._progress_flush_lock:
+            with self._pending_progress_lock:
+                pending, self._pending_progress = self._pending_progress, {}
+            return self.repo.update_progress_many(list(pending.values()))
+
+    def wake(self) -> None:
+        self._queue_dirty = True
+        self._wake_event.set()
+
     def _scheduler_loop(self) -> None:
         while not self._stop_event.is_set():
+            # Cleared before run_once so a wake() that lands mid-iteration triggers another pass.
+            self._wake_event.clear()
             try:
                 self.run_once()
             except Exception:
                 LOGGER.exception("scheduler_iteration_failed")
-            time.sleep(0.5)
+            self._wake_event.wait(SCHEDULER_IDLE_INTERVAL_S)
 
     def run_once(self) -> None:
         self._sync_metrics()
 
-        with self._active_lock:
-            active_count = len(self._active)
+        active_count = len(self._active)
         available = self.max_concurrent_downloads - active_count
         if available <= 0:
             return
 
         queued_ids = self.repo.get_queued_ids(limit=available)
-        for job_id in queued_ids:
-            if not self._try_start_job(job_id):
-                continue
+        if queued_ids:
+            self._start_jobs(queued_ids)
 
     def _sync_metrics(self) -> None:
-        with self._active_lock:
-            self.metrics.set_active_jobs(len(self._active))
-        self.metrics.set_queue_depth(self.repo.count_queue_depth())
+        self.metrics.set_active_jobs(len(self._active))
+        if self._queue_dirty:
+            self._queue_dirty = False
+            self.metrics.set_queue_depth(self.repo.count_queue_depth())
 
-    def _try_start_job(self, job_id: str) -> bool:
+    def _start_jobs(self, job_ids: list[str]) -> list[str]:
+        started: list[tuple[str, Future]] = []
         with self._active_lock:
-            if job_id in self._active:
-                return False
-            cancel_event = threading.Event()
-            future = self.executor.submit(self._worker, job_id, cancel_event)
+            active = dict(self._active)
+            for job_id in job_ids:
+                if job_id in active:
+                    continue
+                cancel_event = threading.Event()
+                future = self.executor.submit(self._worker, job_id, cancel_event)
+                active[job_id] = {
+                    "future": future,
+                    "cancel_event": cancel_event,
+                    "started_monotonic": time.monotonic(),
+                }
+                started.append((job_id, future))
+            if started:
+                self._active = active
+        # Registered outside the lock: an already-finished future runs the callback inline.
+        for job_id, future in started:
             future.add_done_callback(lambda _f, jid=job_id: self._on_future_done(jid))
-            self._active[job_id] = {
-                "future": future,
-                "cancel_event": cancel_event,
-                "started_monotonic": time.monotonic(),
-            }
-        return True
+        return [job_id for job_id, _future in started]
 
     def _on_future_done(self, job_id: str) -> None:
         with self._active_lock:
-            self._active.pop(job_id, None)
+            if job_id in self._active:
+                active = dict(self._active)
+                del active[job_id]
+                self._active = active
         self._sync_metrics()
+        self.wake()
 
     def _worker(self, job_id: str, cancel_event: threading.Event) -> None:
         started = time.monotonic()
-        download = self.repo.get_download(job_id)
+        download = self.repo.get_download(job_id, with_metadata=False)
         if not download:
             return
 
@@ -159,11 +248,12 @@ class QueueManager:
                 return
 
             if not self.repo.set_downloading(job_id, attempt_no, attempt_max, runtime_profile):
-                current = self.repo.get_download(job_id)
+                current = self.repo.get_download(job_id, with_metadata=False)
                 if current and current.get("status") == "paused":
                     self.metrics.observe_duration(preset, "paused", time.monotonic() - started)
                 return
 
+            self._queue_dirty = True
             self.metrics.mark_started(preset)
             attempt_id = self.repo.create_attempt(job_id, attempt_no, runtime_profile)
 
@@ -187,6 +277,7 @@ class QueueManager:
                     info=info,
                     media_local_path=media_path,
                     thumbnail_local_path=thumb_path,
+                    persist_metadata=self.persist_metadata,
                 )
                 self.repo.finalize_attempt(attempt_id, "completed")
                 self.metrics.mark_completed(preset)
@@ -222,6 +313,7 @@ class QueueManager:
                     exception_type="DownloadError",
                 )
                 if self._is_retryable(message, runtime_profile, attempt_no, attempt_max):
+                    cancel_event.wait(self._retry_delay(attempt_no))
                     continue
                 self.repo.set_failed(job_id, message, "DownloadError", runtime_profile, attempt_no, attempt_max)
                 self.metrics.mark_failed(self._failure_reason(message))
@@ -247,6 +339,7 @@ class QueueManager:
                     exception_type=exception_type,
                 )
                 if self._is_retryable(message, runtime_profile, attempt_no, attempt_max):
+                    cancel_event.wait(self._retry_delay(attempt_no))
                     continue
                 self.repo.set_failed(job_id, message, exception_type, runtime_profile, attempt_no, attempt_max)
                 self.metrics.mark_failed(self._failure_reason(message))
@@ -265,12 +358,11 @@ class QueueManager:
 
     def pause_job(self, job_id: str) -> tuple[bool, str]:
         if self.repo.pause_queued(job_id):
+            self._queue_dirty = True
             self.metrics.mark_paused()
             return True, "paused"
 
-        with self._active_lock:
-            handle = self._active.get(job_id)
-
+        handle = self._active.get(job_id)
         if not handle:
             return False, "job_not_active_or_not_queued"
 
@@ -285,6 +377,7 @@ class QueueManager:
         if not self.repo.resume_paused(job_id):
             return False, "invalid_state"
         LOGGER.info("job_resumed", extra={"job_id": job_id})
+        self.wake()
         return True, "queued"
 
     def retry_job(self, job_id: str) -> tuple[bool, str]:
@@ -292,17 +385,18 @@ class QueueManager:
             return False, "invalid_state"
         self.metrics.mark_retried()
         LOGGER.info("job_retried", extra={"job_id": job_id})
+        self.wake()
         return True, "queued"
 
     def delete_job(self, job_id: str) -> tuple[bool, str]:
-        with self._active_lock:
-            handle = self._active.get(job_id)
+        handle = self._active.get(job_id)
         if handle:
             handle["cancel_event"].set()
 
         deleted, record = self.repo.delete_download(job_id)
         if not deleted:
             return False, "not_found"
+        self._queue_dirty = True
 
         self._delete_local_files(record or {})
         LOGGER.info("job_deleted", extra={"job_id": job_id})
@@ -312,36 +406,33 @@ class QueueManager:
         media_path = record.get("media_local_path")
         thumb_path = record.get("thumbnail_local_path")
 
-        candidates: set[str] = set()
-        if isinstance(media_path, str) and media_path:
-            candidates.add(media_path)
-            base_no_ext, _ext = os.path.splitext(media_path)
-            candidates.update({
-                f"{base_no_ext}.info.json",
-                f"{base_no_ext}.jpg",
-                f"{base_no_ext}.webp",
-                f"{base_no_ext}.png",
-            })
+        targets: set[str] = set()
+        media_full = self._safe_storage_path(media_path) if isinstance(media_path, str) and media_path else None
+        if media_full:
+            # Exact sidecar names only: another download's title may share this stem as a prefix.
+            stem = os.path.splitext(media_full)[0]
+            targets.add(media_full)
+            targets.update(stem + suffix for suffix in SIDECAR_SUFFIXES)
 
         if isinstance(thumb_path, str) and thumb_path:
-            candidates.add(thumb_path)
+            thumb_full = self._safe_storage_path(thumb_path)
+            if thumb_full:
+                targets.add(thumb_full)
 
-        for candidate in candidates:
-            full_path = self._safe_storage_path(candidate)
-            if not full_path or not os.path.isfile(full_path):
-                continue
+        for full_path in targets:
             try:
-                os.remove(full_path)
+                os.unlink(full_path)
+            except (FileNotFoundError, IsADirectoryError):
+                continue
             except OSError:
-                LOGGER.exception("file_delete_failed", extra={"path": candidate})
+                LOGGER.exception("file_delete_failed", extra={"path": full_path})
 
     def _safe_storage_path(self, relative_path: str | None) -> str | None:
         if not relative_path:
             return None
         normalized = relative_path.replace("\\", "/").lstrip("/")
-        full_path = os.path.realpath(os.path.join(self.base_download_dir, normalized))
-        base = os.path.realpath(self.base_download_dir)
-        if os.path.commonpath([full_path, base]) != base:
+        full_path = os.path.realpath(os.path.join(self._base_real, normalized))
+        if full_path != self._base_real and not full_path.startswith(self._base_real_prefix):
             return None
         return full_path
 
@@ -364,31 +455,36 @@ class QueueManager:
                 raise PauseRequestedError("paused_by_user")
 
             status = progress.get("status")
-            if status not in {"downloading", "finished"}:
-                return
-
-            downloaded = int(progress.get("downloaded_bytes") or 0)
-            total_raw = progress.get("total_bytes") or progress.get("total_bytes_estimate")
-            total = int(total_raw) if total_raw else None
-            speed = float(progress.get("speed")) if progress.get("speed") else None
-            eta = int(progress.get("eta")) if progress.get("eta") is not None else None
-
             if status == "finished":
-                self.repo.update_progress(job_id, 100.0, downloaded, total or downloaded, None, 0)
-                delta = max(0, downloaded - last_bytes)
-                self.metrics.add_downloaded_bytes(delta)
+                downloaded = int(progress.get("downloaded_bytes") or 0)
+                total_raw = progress.get("total_bytes") or progress.get("total_bytes_estimate")
+                self._queue_progress(job_id, 100.0, downloaded, int(total_raw) if total_raw else downloaded, None, 0)
+                # Postprocessing can run for minutes after this, so 100% lands now rather than on the next tick.
+                self.flush_progress()
+                self.metrics.add_downloaded_bytes(max(0, downloaded - last_bytes))
                 last_bytes = downloaded
                 return
+            if status != "downloading":
+                return
 
+            # yt-dlp fires this many times per second; drop throttled ticks before parsing them.
             now = time.monotonic()
             if now - last_flush < self.progress_flush_interval_s:
                 return
 
+            downloaded = int(progress.get("downloaded_bytes") or 0)
+            total_raw = progress.get("total_bytes") or progress.get("total_bytes_estimate")
+            total = int(total_raw) if total_raw else None
+            speed_raw = progress.get("speed")
+            speed = float(speed_raw) if speed_raw else None
+            eta_raw = progress.get("eta")
+            eta = int(eta_raw) if eta_raw is not None else None
+
             percent = None
             if total and total > 0:
                 percent = round((downloaded / total) * 100, 2)
 
-            self.repo.update_progress(job_id, percent, downloaded, total, speed, eta)
+            self._queue_progress(job_id, percent, downloaded, total, speed, eta)
             delta = max(0, downloaded - last_bytes)
             self.metrics.add_downloaded_bytes(delta)
             last_bytes = downloaded
@@ -409,12 +505,16 @@ class QueueManager:
             )
 
         options = self._build_ydl_options(url, preset, runtime_profile, progress_hook)
-        with YoutubeDL(options) as ydl:
-            raw_info = ydl.extract_info(url, download=True)
-            if hasattr(ydl, "sanitize_info"):
-                info = ydl.sanitize_info(raw_info, remove_private_keys=False)
-            else:
-                info = raw_info
+        try:
+            with YoutubeDL(options) as ydl:
+                raw_info = ydl.extract_info(url, download=True)
+                if self.persist_metadata and hasattr(ydl, "sanitize_info"):
+                    info = ydl.sanitize_info(raw_info, remove_private_keys=False)
+                else:
+                    info = raw_info
+        finally:
+            # Land this job's last tick before the worker records a terminal status.
+            self.flush_progress()
 
         if isinstance(info, dict) and info.get("_type") == "playlist":
             entries = info.get("entries") or []
@@ -432,7 +532,14 @@ class QueueManager:
         runtime_profile: str,
         progress_hook,
     ) -> dict[str, Any]:
-        preset_cfg = PRESET_CONFIG.get(preset, PRESET_CONFIG["best"])
+        if preset not in PRESET_CONFIG:
+            preset = "best"
+        options = dict(self._ydl_option_templates[(preset, runtime_profile, self.is_youtube_url(url))])
+        options["progress_hooks"] = [progress_hook]
+        return options
+
+    def _build_ydl_option_template(self, preset: str, runtime_profile: str, is_youtube: bool) -> dict[str, Any]:
+        preset_cfg = PRESET_CONFIG[preset]
 
         options: dict[str, Any] = {
             "outtmpl": os.path.join(self.base_download_dir, "%(title).200B [%(id)s].%(ext)s"),
@@ -442,11 +549,18 @@ class QueueManager:
             "writeinfojson": True,
             "retries": 3,
             "noprogress": True,
-            "concurrent_fragment_downloads": 5,
+            "concurrent_fragment_downloads": self.ytdlp_fragment_concurrency,
+            "buffersize": self.ytdlp_buffer_size,
             "format": preset_cfg["format"],
-            "progress_hooks": [progress_hook],
+            "retry_sleep_functions": {
+                "http": self._ytdlp_retry_sleep,
+                "fragment": self._ytdlp_retry_sleep,
+            },
         }
 
+        if self.ytdlp_http_chunk_size:
+            options["http_chunk_size"] = self.ytdlp_http_chunk_size
+
         if preset_cfg.get("audio_only"):
             options["postprocessors"] = [
                 {
@@ -466,7 +580,7 @@ class QueueManager:
         if self.ytdlp_ffmpeg_path:
             options["ffmpeg_location"] = self.ytdlp_ffmpeg_path
 
-        if self.is_youtube_url(url) and runtime_profile == "fallback":
+        if is_youtube and runtime_profile == "fallback":
             options["extractor_args"] = {
                 "youtube": {
                     "player_client": ["android_vr", "android", "ios", "tv"],
@@ -483,7 +597,8 @@ class QueueManager:
                     continue
                 path = item.get("filepath") or item.get("_filename")
                 relative = self._to_relative(path)
-                if relative and self._safe_storage_path(relative) and os.path.isfile(self._safe_storage_path(relative) or ""):
+                full = self._safe_storage_path(relative)
+                if full and os.path.isfile(full):
                     return relative
 
         direct_candidates = [
@@ -493,29 +608,35 @@ class QueueManager:
         ]
         for path in direct_candidates:
             relative = self._to_relative(path)
-            if relative and self._safe_storage_path(relative) and os.path.isfile(self._safe_storage_path(relative) or ""):
+            full = self._safe_storage_path(relative)
+            if full and os.path.isfile(full):
                 return relative
 
         video_id = info.get("id")
         if not video_id:
             return None
 
-        pattern = os.path.join(self.base_download_dir, f"*[{video_id}].*")
-        candidates = []
-        for path in glob.glob(pattern):
-            ext = os.path.splitext(path)[1].lower()
-            if ext in {".json", ".part", ".ytdl", ".tmp", ".jpg", ".webp", ".png"}:
-                continue
-            if path.endswith(".info.json"):
-                continue
-            if os.path.isfile(path):
-                candidates.append(path)
+        # Substring match: glob would read "[id]" as a character class.
+        needle = f"[{video_id}]."
+        candidates: list[tuple[float, str]] = []
+        try:
+            with os.scandir(self.base_download_dir) as entries:
+                for entry in entries:
+                    name = entry.name
+                    if needle not in name or name.endswith(".info.json"):
+                        continue
+                    if os.path.splitext(name)[1].lower() in NON_MEDIA_SUFFIXES:
+                        continue
+                    if entry.is_file():
+                        candidates.append((entry.stat().st_mtime, entry.path))
+        except OSError:
+            return None
 
         if not candidates:
             return None
 
-        candidates.sort(key=lambda item: os.path.getmtime(item), reverse=True)
-        return self._to_relative(candidates[0])
+        candidates.sort(reverse=True)
+        return self._to_relative(candidates[0][1])
 
     def _resolve_thumbnail_path(self, media_relative_path: str | None) -> str | None:
         if not media_relative_path:
@@ -533,29 +654,30 @@ class QueueManager:
             return None
         if os.path.isabs(path):
             full = os.path.realpath(path)
-            base = os.path.realpath(self.base_download_dir)
-            if os.path.commonpath([full, base]) != base:
+            if not full.startswith(self._base_real_prefix):
                 return None
-            return os.path.relpath(full, base)
+            return full[len(self._base_real_prefix):]
         return path.lstrip("/")
 
+    def _retry_delay(self, retry_no: int) -> float:
+        # Full jitter keeps jobs that failed together from retrying in lockstep.
+        return random.uniform(0, min(self.retry_max_s, self.retry_base_s * (2 ** max(0, retry_no - 1))))
+
+    def _ytdlp_retry_sleep(self, n: int) -> float:
+        # yt-dlp calls sleep functions as sleep_func(n=retries_so_far), starting at 0.
+        return self._retry_delay(n + 1)
+
     def _is_retryable(self, message: str, runtime_profile: str, attempt_no: int, attempt_max: int) -> bool:
         if runtime_profile != "primary" or attempt_no >= attempt_max:
             return False
-        lowered = message.lower()
-        return any(token in lowered for token in RETRYABLE_ERROR_TOKENS)
+        return _RETRYABLE_ERROR_RE.search(message) is not None
 
     def _failure_reason(self, message: str) -> str:
-        lowered = message.lower()
-        if "403" in lowered or "forbidden" in lowered:
-            return "forbidden"
-        if "network" in lowered:
-            return "network"
-        if "not available" in lowered:
-            return "unavailable"
-        return "other"
+        found = {FAILURE_REASON_TOKENS[token.lower()] for token in _FAILURE_REASON_RE.findall(message)}
+        return next((reason for reason in FAILURE_REASON_PRIORITY if reason in found), "other")
 
     @staticmethod
+    @lru_cache(maxsize=1024)
     def is_youtube_url(url: str) -> bool:
         host = (urlparse(url).hostname or "").lower()
         return "youtube.com" in host or "youtu.be" in host
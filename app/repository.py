@@ -1,32 +1,90 @@
 import json
 import os
 import sqlite3
+import time
 from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Any
 
-from .db import get_connection, init_db
+import orjson
+
+from .db import FTS_MIN_QUERY_LENGTH, ConnectionPool, batch_update_progress, init_db
+
+# Per-format and per-language blobs from yt-dlp; often 10x the rest of info and never read back.
+METADATA_EXCLUDED_KEYS = frozenset({"formats", "requested_formats", "automatic_captions", "subtitles", "heatmap"})
+
+# Sorts that support keyset pagination, mapped to the row-value comparison that seeks past a cursor.
+KEYSET_SORTS = {"created_desc": "<", "created_asc": ">"}
+
+GALLERY_COLUMNS = (
+    "id",
+    "media_local_path",
+    "title",
+    "video_id",
+    "requested_url",
+    "uploader",
+    "thumbnail_local_path",
+    "webpage_url",
+    "status",
+    "created_at",
+)
+
+
+_now_prefix_cache: tuple[int, str] = (-1, "")
 
 
 def utc_now_iso() -> str:
-    return datetime.now(timezone.utc).isoformat()
+    # Same shape as datetime.isoformat(), but the date/time prefix is only formatted once per second.
+    global _now_prefix_cache
+    now_us = time.time_ns() // 1000
+    second, micro = divmod(now_us, 1_000_000)
+    cached_second, prefix = _now_prefix_cache
+    if cached_second != second:
+        prefix = datetime.fromtimestamp(second, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+        _now_prefix_cache = (second, prefix)
+    return f"{prefix}.{micro:06d}+00:00"
+
+
+@lru_cache(maxsize=128)
+def _update_fields_sql(columns: tuple[str, ...]) -> str:
+    assignments = ", ".join(f"{column} = ?" for column in columns)
+    return f"UPDATE downloads SET {assignments} WHERE id = ?"
 
 
 class DownloadRepository:
-    def __init__(self, sqlite_path: str):
+    def __init__(self, sqlite_path: str, pool_size: int = 4):
         self.sqlite_path = sqlite_path
+        self.pool = ConnectionPool(sqlite_path, pool_size=pool_size)
 
     def init(self) -> None:
         init_db(self.sqlite_path)
 
-    def _fetchone(self, query: str, params: tuple[Any, ...] = ()) -> dict[str, Any] | None:
-        with get_connection(self.sqlite_path) as connection:
+    def close(self) -> None:
+        self.pool.close()
+
+    def storage_version(self) -> tuple[int, ...]:
+        # Changes whenever this process commits; the file stats also catch commits from other processes.
+        version = [self.pool.write_generation]
+        for path in (self.sqlite_path, f"{self.sqlite_path}-wal"):
+            try:
+                stat_result = os.stat(path)
+            except FileNotFoundError:
+                version.extend((0, 0))
+            else:
+                version.extend((stat_result.st_mtime_ns, stat_result.st_size))
+        return tuple(version)
+
+    def _fetchone(
+        self, query: str, params: tuple[Any, ...] = (), with_metadata: bool = True
+    ) -> dict[str, Any] | None:
+        with self.pool.reader() as connection:
             row = connection.execute(query, params).fetchone()
-            return self._row_to_dict(row)
+        if not with_metadata:
+            return dict(row) if row is not None else None
+        return self._row_to_dict(row)
 
     def _execute(self, query: str, params: tuple[Any, ...] = ()) -> int:
-        with get_connection(self.sqlite_path) as connection:
-            cursor = connection.execute(query, params)
-            return cursor.rowcount
+        return self.pool.write(lambda connection: connection.execute(query, params).rowcount)
 
     def _row_to_dict(self, row: sqlite3.Row | None) -> dict[str, Any] | None:
         if row is None:
@@ -35,8 +93,8 @@ class DownloadRepository:
         metadata_json = data.get("metadata_json")
         if metadata_json:
             try:
-                data["metadata"] = json.loads(metadata_json)
-            except json.JSONDecodeError:
+                data["metadata"] = orjson.loads(metadata_json)
+            except orjson.JSONDecodeError:
                 data["metadata"] = None
         else:
             data["metadata"] = None
@@ -45,45 +103,77 @@ class DownloadRepository:
     @staticmethod
     def _to_json_string(value: dict[str, Any]) -> str:
         try:
-            return json.dumps(value, ensure_ascii=False)
-        except TypeError:
+            return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits, which orjson refuses.
             return json.dumps(value, ensure_ascii=False, default=str)
 
-    def create_download(self, download_id: str, requested_url: str, preset: str) -> dict[str, Any]:
+    @staticmethod
+    def _insert_queued(
+        connection: sqlite3.Connection, download_id: str, requested_url: str, preset: str
+    ) -> sqlite3.Row:
         now = utc_now_iso()
-        with get_connection(self.sqlite_path) as connection:
-            connection.execute(
+        # fetchall() steps the statement to completion so it never holds the batch's COMMIT open.
+        rows = connection.execute(
+            """
+            INSERT INTO downloads (
+                id, requested_url, canonical_url, preset, status,
+                progress_percent, downloaded_bytes, total_bytes,
+                speed_bps, eta_seconds, attempt_current, attempt_max,
+                created_at, queued_at, updated_at
+            )
+            VALUES (?, ?, ?, ?, 'queued', 0, 0, NULL, NULL, NULL, 0, 1, ?, ?, ?)
+            RETURNING *
+            """,
+            (download_id, requested_url, requested_url, preset, now, now, now),
+        ).fetchall()
+        return rows[0]
+
+    def create_download(self, download_id: str, requested_url: str, preset: str) -> dict[str, Any]:
+        row = self.pool.write(lambda connection: self._insert_queued(connection, download_id, requested_url, preset))
+        return self._row_to_dict(row) or {}
+
+    def create_or_get_active_download(
+        self, download_id: str, requested_url: str, preset: str
+    ) -> tuple[dict[str, Any], bool]:
+        def _insert(connection: sqlite3.Connection) -> tuple[sqlite3.Row, bool]:
+            existing = connection.execute(
                 """
-                INSERT INTO downloads (
-                    id, requested_url, canonical_url, preset, status,
-                    progress_percent, downloaded_bytes, total_bytes,
-                    speed_bps, eta_seconds, attempt_current, attempt_max,
-                    created_at, queued_at, updated_at
-                )
-                VALUES (?, ?, ?, ?, 'queued', 0, 0, NULL, NULL, NULL, 0, 1, ?, ?, ?)
+                SELECT * FROM downloads
+                WHERE requested_url = ?
+                  AND preset = ?
+                  AND status IN ('queued', 'downloading')
+                ORDER BY created_at DESC
+                LIMIT 1
                 """,
-                (download_id, requested_url, requested_url, preset, now, now, now),
-            )
-        return self.get_download(download_id) or {}
+                (requested_url, preset),
+            ).fetchone()
+            if existing:
+                return existing, False
+            return self._insert_queued(connection, download_id, requested_url, preset), True
+
+        row, created = self.pool.write(_insert)
+        return self._row_to_dict(row) or {}, created
 
-    def get_download(self, download_id: str) -> dict[str, Any] | None:
-        return self._fetchone("SELECT * FROM downloads WHERE id = ?", (download_id,))
+    def get_download(self, download_id: str, with_metadata: bool = True) -> dict[str, Any] | None:
+        return self._fetchone("SELECT * FROM downloads WHERE id = ?", (download_id,), with_metadata)
 
     def get_download_by_filename(self, filename: str) -> dict[str, Any] | None:
         return self._fetchone(
             """
             SELECT * FROM downloads
-            WHERE media_local_path = ?
-               OR media_local_path LIKE ?
-               OR thumbnail_local_path = ?
-               OR thumbnail_local_path LIKE ?
+            WHERE replace(media_local_path, rtrim(media_local_path, replace(media_local_path, '/', '')), '') = ?
+               OR replace(thumbnail_local_path, rtrim(thumbnail_local_path, replace(thumbnail_local_path, '/', '')), '') = ?
             ORDER BY created_at DESC
             LIMIT 1
             """,
-            (filename, f"%/{filename}", filename, f"%/{filename}"),
+            (filename, filename),
+            False,
         )
 
     def recover_interrupted_downloads(self) -> int:
+        if not self._fetchone("SELECT 1 FROM downloads WHERE status = 'downloading' LIMIT 1", (), False):
+            return 0
         now = utc_now_iso()
         return self._execute(
             """
@@ -98,7 +188,7 @@ class DownloadRepository:
         )
 
     def get_queued_ids(self, limit: int) -> list[str]:
-        with get_connection(self.sqlite_path) as connection:
+        with self.pool.reader() as connection:
             rows = connection.execute(
                 "SELECT id FROM downloads WHERE status = 'queued' ORDER BY created_at ASC LIMIT ?",
                 (limit,),
@@ -109,16 +199,13 @@ class DownloadRepository:
         if not fields:
             return False
         fields["updated_at"] = utc_now_iso()
-        assignments = ", ".join(f"{key} = ?" for key in fields)
-        values = list(fields.values())
-        values.append(download_id)
-        updated = self._execute(f"UPDATE downloads SET {assignments} WHERE id = ?", tuple(values))
+        updated = self._execute(_update_fields_sql(tuple(fields)), (*fields.values(), download_id))
         return updated > 0
 
     def set_downloading(self, download_id: str, attempt_current: int, attempt_max: int, runtime_profile: str) -> bool:
         now = utc_now_iso()
-        with get_connection(self.sqlite_path) as connection:
-            row = connection.execute(
+        return (
+            self._execute(
                 """
                 UPDATE downloads
                 SET status = 'downloading',
@@ -134,7 +221,8 @@ class DownloadRepository:
                 """,
                 (now, attempt_current, attempt_max, runtime_profile, now, download_id),
             )
-        return row.rowcount > 0
+            > 0
+        )
 
     def pause_queued(self, download_id: str) -> bool:
         now = utc_now_iso()
@@ -271,70 +359,49 @@ class DownloadRepository:
         info: dict[str, Any] | None,
         media_local_path: str | None,
         thumbnail_local_path: str | None,
+        persist_metadata: bool = True,
     ) -> bool:
         info = info or {}
         now = utc_now_iso()
-        metadata_json = self._to_json_string(info)
-        return (
-            self._execute(
-                """
-                UPDATE downloads
-                SET status = 'completed',
-                    runtime_profile = ?,
-                    attempt_current = ?,
-                    attempt_max = ?,
-                    webpage_url = ?,
-                    extractor = ?,
-                    extractor_key = ?,
-                    video_id = ?,
-                    title = ?,
-                    uploader = ?,
-                    uploader_id = ?,
-                    channel = ?,
-                    channel_id = ?,
-                    duration_seconds = ?,
-                    upload_date = ?,
-                    thumbnail_remote_url = ?,
-                    thumbnail_local_path = ?,
-                    media_local_path = ?,
-                    media_ext = ?,
-                    progress_percent = 100,
-                    speed_bps = NULL,
-                    eta_seconds = NULL,
-                    error_message = NULL,
-                    last_exception_type = NULL,
-                    metadata_json = ?,
-                    completed_at = ?,
-                    updated_at = ?
-                WHERE id = ?
-                """,
-                (
-                    runtime_profile,
-                    attempt_current,
-                    attempt_max,
-                    info.get("webpage_url"),
-                    info.get("extractor"),
-                    info.get("extractor_key"),
-                    info.get("id"),
-                    info.get("title"),
-                    info.get("uploader"),
-                    info.get("uploader_id"),
-                    info.get("channel"),
-                    info.get("channel_id"),
-                    info.get("duration"),
-                    info.get("upload_date"),
-                    info.get("thumbnail"),
-                    thumbnail_local_path,
-                    media_local_path,
-                    os.path.splitext(media_local_path or "")[1].lstrip(".") or info.get("ext"),
-                    metadata_json,
-                    now,
-                    now,
-                    download_id,
-                ),
+        metadata_json = None
+        if persist_metadata:
+            metadata_json = self._to_json_string(
+                {key: value for key, value in info.items() if key not in METADATA_EXCLUDED_KEYS}
             )
-            > 0
-        )
+        optional = {
+            "webpage_url": info.get("webpage_url"),
+            "extractor": info.get("extractor"),
+            "extractor_key": info.get("extractor_key"),
+            "video_id": info.get("id"),
+            "title": info.get("title"),
+            "uploader": info.get("uploader"),
+            "uploader_id": info.get("uploader_id"),
+            "channel": info.get("channel"),
+            "channel_id": info.get("channel_id"),
+            "duration_seconds": info.get("duration"),
+            "upload_date": info.get("upload_date"),
+            "thumbnail_remote_url": info.get("thumbnail"),
+            "thumbnail_local_path": thumbnail_local_path,
+            "media_local_path": media_local_path,
+            "media_ext": os.path.splitext(media_local_path or "")[1].lstrip(".") or info.get("ext"),
+        }
+        # Columns yt-dlp did not report are left out of SET, so indexes and FTS triggers on them stay untouched.
+        fields: dict[str, Any] = {
+            "status": "completed",
+            "runtime_profile": runtime_profile,
+            "attempt_current": attempt_current,
+            "attempt_max": attempt_max,
+            **{column: value for column, value in optional.items() if value is not None},
+            "progress_percent": 100,
+            "speed_bps": None,
+            "eta_seconds": None,
+            "error_message": None,
+            "last_exception_type": None,
+            "metadata_json": metadata_json,
+            "completed_at": now,
+            "updated_at": now,
+        }
+        return self._execute(_update_fields_sql(tuple(fields)), (*fields.values(), download_id)) > 0
 
     def update_progress(
         self,
@@ -346,32 +413,24 @@ class DownloadRepository:
         eta_seconds: int | None,
     ) -> bool:
         return (
-            self._execute(
-                """
-                UPDATE downloads
-                SET progress_percent = ?,
-                    downloaded_bytes = ?,
-                    total_bytes = ?,
-                    speed_bps = ?,
-                    eta_seconds = ?,
-                    updated_at = ?
-                WHERE id = ?
-                """,
-                (
-                    progress_percent,
-                    downloaded_bytes,
-                    total_bytes,
-                    speed_bps,
-                    eta_seconds,
-                    utc_now_iso(),
-                    download_id,
-                ),
+            self.update_progress_many(
+                [(progress_percent, downloaded_bytes, total_bytes, speed_bps, eta_seconds, download_id)]
             )
             > 0
         )
 
+    def update_progress_many(
+        self,
+        updates: list[tuple[float | None, int | None, int | None, float | None, int | None, str]],
+    ) -> int:
+        if not updates:
+            return 0
+        now = utc_now_iso()
+        rows = [(*values, now, download_id) for *values, download_id in updates]
+        return self.pool.write(lambda connection: batch_update_progress(connection, rows))
+
     def create_attempt(self, download_id: str, attempt_no: int, runtime_profile: str) -> int:
-        with get_connection(self.sqlite_path) as connection:
+        def _insert(connection: sqlite3.Connection) -> int:
             cursor = connection.execute(
                 """
                 INSERT INTO download_attempts (download_id, attempt_no, runtime_profile, status, started_at)
@@ -381,6 +440,8 @@ class DownloadRepository:
             )
             return int(cursor.lastrowid)
 
+        return self.pool.write(_insert)
+
     def finalize_attempt(
         self,
         attempt_id: int,
@@ -404,19 +465,19 @@ class DownloadRepository:
         )
 
     def delete_download(self, download_id: str) -> tuple[bool, dict[str, Any] | None]:
-        record = self.get_download(download_id)
-        if not record:
+        rows = self.pool.write(
+            lambda connection: connection.execute("DELETE FROM downloads WHERE id = ? RETURNING *", (download_id,)).fetchall()
+        )
+        if not rows:
             return False, None
-        deleted = self._execute("DELETE FROM downloads WHERE id = ?", (download_id,)) > 0
-        return deleted, record
+        return True, dict(rows[0])
 
     def count_by_status(self, status: str) -> int:
-        row = self._fetchone("SELECT COUNT(*) AS cnt FROM downloads WHERE status = ?", (status,))
+        row = self._fetchone("SELECT cnt FROM status_counts WHERE status = ?", (status,), False)
         return int(row["cnt"]) if row else 0
 
     def count_queue_depth(self) -> int:
-        row = self._fetchone("SELECT COUNT(*) AS cnt FROM downloads WHERE status = 'queued'")
-        return int(row["cnt"]) if row else 0
+        return self.count_by_status("queued")
 
     def list_downloads(
         self,
@@ -426,6 +487,9 @@ class DownloadRepository:
         q: str | None,
         sort: str,
         uploader: str | None,
+        columns: tuple[str, ...] | None = None,
+        after: tuple[str, str] | None = None,
+        with_metadata: bool = True,
     ) -> tuple[list[dict[str, Any]], int]:
         where: list[str] = []
         params: list[Any] = []
@@ -434,9 +498,12 @@ class DownloadRepository:
             where.append("status = ?")
             params.append(status)
         if uploader:
-            where.append("LOWER(COALESCE(uploader, '')) = LOWER(?)")
+            where.append("uploader = ? COLLATE NOCASE")
             params.append(uploader)
-        if q:
+        if q and len(q) >= FTS_MIN_QUERY_LENGTH:
+            where.append("rowid IN (SELECT rowid FROM downloads_fts WHERE downloads_fts MATCH ?)")
+            params.append('"' + q.replace('"', '""') + '"')
+        elif q:
             where.append(
                 "(LOWER(COALESCE(title, '')) LIKE ? OR LOWER(COALESCE(uploader, '')) LIKE ? OR LOWER(COALESCE(video_id, '')) LIKE ?)"
             )
@@ -446,41 +513,55 @@ class DownloadRepository:
         where_clause = f"WHERE {' AND '.join(where)}" if where else ""
 
         order_by = {
-            "created_desc": "created_at DESC",
-            "created_asc": "created_at ASC",
+            "created_desc": "created_at DESC, id DESC",
+            "created_asc": "created_at ASC, id ASC",
             "title_asc": "LOWER(COALESCE(title, '')) ASC, created_at DESC",
             "uploader_asc": "LOWER(COALESCE(uploader, '')) ASC, created_at DESC",
-        }.get(sort, "created_at DESC")
+        }.get(sort, "created_at DESC, id DESC")
 
+        page_where = list(where)
+        page_params = list(params)
         offset = (page - 1) * per_page
-        with get_connection(self.sqlite_path) as connection:
+        # Keyset pages seek past the last (created_at, id) seen instead of skipping OFFSET rows.
+        keyset_op = KEYSET_SORTS.get(sort) if after else None
+        if keyset_op:
+            page_where.append(f"(created_at, id) {keyset_op} (?, ?)")
+            page_params.extend(after)
+            offset = 0
+        page_where_clause = f"WHERE {' AND '.join(page_where)}" if page_where else ""
+
+        select_list = ", ".join(columns) if columns else "*"
+        # A text search is the expensive predicate; evaluate it once and take the total from a window.
+        # Unfiltered pages keep the separate COUNT, which is an index-only scan, so LIMIT can stop early.
+        use_window_total = bool(q) and not keyset_op
+        total_column = ", COUNT(*) OVER () AS _total" if use_window_total else ""
+        with self.pool.reader() as connection:
             rows = connection.execute(
-                f"SELECT * FROM downloads {where_clause} ORDER BY {order_by} LIMIT ? OFFSET ?",
-                tuple(params + [per_page, offset]),
+                f"SELECT {select_list}{total_column} FROM downloads {page_where_clause} "
+                f"ORDER BY {order_by} LIMIT ? OFFSET ?",
+                tuple(page_params + [per_page, offset]),
             ).fetchall()
-            count_row = connection.execute(
-                f"SELECT COUNT(*) AS cnt FROM downloads {where_clause}",
-                tuple(params),
-            ).fetchone()
-
-        total = int(count_row["cnt"]) if count_row else 0
-        return [self._row_to_dict(row) or {} for row in rows], total
+            if use_window_total and rows:
+                total = int(rows[0]["_total"])
+            else:
+                count_row = connection.execute(
+                    f"SELECT COUNT(*) AS cnt FROM downloads {where_clause}",
+                    tuple(params),
+                ).fetchone()
+                total = int(count_row["cnt"]) if count_row else 0
+
+        if columns or not with_metadata:
+            items = [dict(row) for row in rows]
+        else:
+            items = [self._row_to_dict(row) or {} for row in rows]
+        if use_window_total:
+            for item in items:
+                item.pop("_total", None)
+        return items, total
 
     def check_read_write(self) -> bool:
-        with get_connection(self.sqlite_path) as connection:
-            connection.execute(
-                """
-                CREATE TABLE IF NOT EXISTS _readyz_probe (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    ts TEXT NOT NULL
-                )
-                """
-            )
-            cursor = connection.execute(
-                "INSERT INTO _readyz_probe (ts) VALUES (?)",
-                (utc_now_iso(),),
-            )
-            probe_id = cursor.lastrowid
-            connection.execute("DELETE FROM _readyz_probe WHERE id = ?", (probe_id,))
-            connection.execute("SELECT 1").fetchone()
+        def _probe(connection: sqlite3.Connection) -> None:
+            connection.execute("INSERT INTO _readyz_probe (ts) VALUES (?)", (utc_now_iso(),))
+
+        self.pool.probe_write(_probe)
         return True
@@ -3,6 +3,7 @@ from pathlib import Path
 import pytest
 
 from app.main import create_app
+from app.repository import utc_now_iso
 
 
 @pytest.fixture
@@ -44,3 +45,37 @@ def repo(app):
 @pytest.fixture
 def queue_manager(app):
     return app.extensions["queue_manager"]
+
+
+@pytest.fixture
+def insert_completed(repo):
+    def _insert(rows):
+        now = utc_now_iso()
+        params = [
+            (
+                row["id"],
+                row["requested_url"],
+                row.get("title"),
+                row.get("uploader"),
+                row.get("video_id"),
+                row.get("media_local_path"),
+                row.get("created_at") or now,
+                now,
+            )
+            for row in rows
+        ]
+        return repo.pool.write(
+            lambda connection: connection.executemany(
+                """
+                INSERT INTO downloads (
+                    id, requested_url, canonical_url, preset, status, title, uploader, video_id,
+                    media_local_path, progress_percent, downloaded_bytes, attempt_current, attempt_max,
+                    created_at, queued_at, completed_at, updated_at
+                )
+                VALUES (?1, ?2, ?2, 'best', 'completed', ?3, ?4, ?5, ?6, 100, 0, 1, 1, ?7, ?7, ?8, ?8)
+                """,
+                params,
+            ).rowcount
+        )
+
+    return _insert
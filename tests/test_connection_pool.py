@@ -0,0 +1,109 @@
+import sqlite3
+import threading
+
+import pytest
+
+from app.db import WAL_AUTOCHECKPOINT_PAGES, ConnectionPool, WriterThread, init_db
+
+
+def test_pool_reuses_reader_and_sees_committed_writes(tmp_path):
+    sqlite_path = str(tmp_path / "pool.db")
+    init_db(sqlite_path)
+    pool = ConnectionPool(sqlite_path, pool_size=2)
+
+    with pool.reader() as first:
+        pass
+    with pool.reader() as second:
+        assert second is first
+
+    pool.write(
+        lambda connection: connection.execute(
+            """
+            INSERT INTO downloads (id, requested_url, preset, status, created_at, updated_at)
+            VALUES ('pool1', 'https://example.com', 'best', 'queued', 'now', 'now')
+            """
+        )
+    )
+
+    with pool.reader() as connection:
+        row = connection.execute("SELECT status FROM downloads WHERE id = 'pool1'").fetchone()
+    assert row["status"] == "queued"
+
+    pool.close()
+
+
+def test_configured_connection_pragmas(tmp_path):
+    sqlite_path = str(tmp_path / "pragmas.db")
+    init_db(sqlite_path)
+    pool = ConnectionPool(sqlite_path)
+
+    with pool.reader() as connection:
+        assert connection.execute("PRAGMA busy_timeout").fetchone()[0] == 30000
+        assert connection.execute("PRAGMA cache_size").fetchone()[0] == -20000
+        assert connection.execute("PRAGMA temp_store").fetchone()[0] == 2
+
+    pool.close()
+
+
+def test_reader_connections_are_query_only(tmp_path):
+    sqlite_path = str(tmp_path / "readonly.db")
+    init_db(sqlite_path)
+    pool = ConnectionPool(sqlite_path)
+
+    with pool.reader() as connection:
+        with pytest.raises(sqlite3.OperationalError):
+            connection.execute("DELETE FROM downloads")
+
+    pool.close()
+
+
+def test_failed_write_does_not_roll_back_batched_neighbours(tmp_path):
+    sqlite_path = str(tmp_path / "writer.db")
+    init_db(sqlite_path)
+    pool = ConnectionPool(sqlite_path)
+
+    def _insert(download_id):
+        return lambda connection: connection.execute(
+            """
+            INSERT INTO downloads (id, requested_url, preset, status, created_at, updated_at)
+            VALUES (?, 'https://example.com', 'best', 'queued', 'now', 'now')
+            """,
+            (download_id,),
+        ).rowcount
+
+    futures = [
+        pool.submit_write(_insert("ok1")),
+        pool.submit_write(_insert("ok1")),
+        pool.submit_write(_insert("ok2")),
+    ]
+
+    assert futures[0].result(timeout=5) == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        futures[1].result(timeout=5)
+    assert futures[2].result(timeout=5) == 1
+
+    with pool.reader() as connection:
+        ids = {row["id"] for row in connection.execute("SELECT id FROM downloads")}
+    assert ids == {"ok1", "ok2"}
+
+    pool.close()
+
+
+def test_writer_checkpoints_wal_once_idle(tmp_path, monkeypatch):
+    sqlite_path = str(tmp_path / "checkpoint.db")
+    init_db(sqlite_path)
+    checkpointed = threading.Event()
+    original = WriterThread._checkpoint
+
+    def _checkpoint(self, connection):
+        original(self, connection)
+        checkpointed.set()
+
+    monkeypatch.setattr(WriterThread, "_checkpoint", _checkpoint)
+    pool = ConnectionPool(sqlite_path, checkpoint_idle_s=0.05)
+
+    autocheckpoint = pool.write(lambda connection: connection.execute("PRAGMA wal_autocheckpoint").fetchone()[0])
+    assert autocheckpoint == WAL_AUTOCHECKPOINT_PAGES
+    assert checkpointed.wait(timeout=5)
+
+    pool.close()
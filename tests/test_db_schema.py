@@ -22,7 +22,75 @@ def test_db_schema_created(app):
 
     assert "idx_downloads_status_created" in indexes
     assert "idx_downloads_completed_at" in indexes
-    assert "idx_downloads_title" in indexes
-    assert "idx_downloads_uploader" in indexes
+    assert "idx_downloads_title" not in indexes
+    assert "idx_downloads_uploader" not in indexes
+    assert "idx_downloads_status_uploader_created" in indexes
+    assert "idx_downloads_uploader_created" in indexes
     assert "idx_downloads_video_id" in indexes
     assert "idx_attempts_download_id" in indexes
+
+
+def test_filename_lookup_uses_basename_indexes(repo):
+    repo.create_download("by-name", "https://youtube.com/watch?v=byname", "best")
+    repo.update_fields("by-name", media_local_path="sub/Clip [byname].mp4", thumbnail_local_path="Clip [byname].jpg")
+
+    assert repo.get_download_by_filename("Clip [byname].mp4")["id"] == "by-name"
+    assert repo.get_download_by_filename("Clip [byname].jpg")["id"] == "by-name"
+    assert repo.get_download_by_filename("Clip [byname]") is None
+
+    with repo.pool.reader() as connection:
+        plan = " ".join(
+            str(row["detail"])
+            for row in connection.execute(
+                """
+                EXPLAIN QUERY PLAN SELECT * FROM downloads
+                WHERE replace(media_local_path, rtrim(media_local_path, replace(media_local_path, '/', '')), '') = ?
+                   OR replace(thumbnail_local_path, rtrim(thumbnail_local_path, replace(thumbnail_local_path, '/', '')), '') = ?
+                """,
+                ("x", "x"),
+            )
+        )
+    assert "idx_downloads_media_basename" in plan
+    assert "idx_downloads_thumbnail_basename" in plan
+
+
+def test_status_counts_follow_inserts_updates_and_deletes(repo):
+    repo.create_download("cnt-1", "https://youtube.com/watch?v=cnt1", "best")
+    repo.create_download("cnt-2", "https://youtube.com/watch?v=cnt2", "best")
+    assert repo.count_queue_depth() == 2
+
+    repo.update_fields("cnt-1", status="completed")
+    repo.update_fields("cnt-1", title="status unchanged")
+    assert repo.count_queue_depth() == 1
+    assert repo.count_by_status("completed") == 1
+
+    repo.delete_download("cnt-1")
+    assert repo.count_by_status("completed") == 0
+
+
+def test_status_counts_are_backfilled_for_existing_databases(app, repo):
+    repo.create_download("fill-1", "https://youtube.com/watch?v=fill1", "best")
+    with sqlite3.connect(app.config["SQLITE_PATH"]) as connection:
+        connection.execute("DROP TABLE status_counts")
+
+    from app.db import init_db
+
+    init_db(app.config["SQLITE_PATH"])
+    assert repo.count_queue_depth() == 1
+
+
+def test_default_gallery_page_is_an_index_only_scan(repo):
+    from app.repository import GALLERY_COLUMNS
+
+    with repo.pool.reader() as connection:
+        plan = " ".join(
+            str(row["detail"])
+            for row in connection.execute(
+                f"EXPLAIN QUERY PLAN SELECT {', '.join(GALLERY_COLUMNS)} FROM downloads "
+                "WHERE status = ? ORDER BY created_at DESC, id DESC LIMIT 20 OFFSET 0",
+                ("completed",),
+            )
+        )
+
+    assert "COVERING INDEX idx_downloads_gallery_covering" in plan
+    assert "TEMP B-TREE" not in plan
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 
@@ -19,6 +20,8 @@ def test_delete_job_removes_db_row_and_local_files(app, client, repo):
     (base / media_rel).write_text("video", encoding="utf-8")
     (base / thumb_rel).write_text("thumb", encoding="utf-8")
     (base / info_rel).write_text("{}", encoding="utf-8")
+    (base / "Sample [iddel].webp").write_text("thumb", encoding="utf-8")
+    (base / "Sample [other].mp4").write_text("keep", encoding="utf-8")
 
     repo.create_download("iddel", "https://youtube.com/watch?v=iddel", "best")
     repo.update_fields(
@@ -37,3 +40,93 @@ def test_delete_job_removes_db_row_and_local_files(app, client, repo):
     assert not (base / media_rel).exists()
     assert not (base / thumb_rel).exists()
     assert not (base / info_rel).exists()
+    assert not (base / "Sample [iddel].webp").exists()
+    assert (base / "Sample [other].mp4").exists()
+
+
+def test_delete_job_keeps_files_of_downloads_sharing_a_prefix(app, client, repo):
+    base = Path(app.config["BASE_DOWNLOAD_DIR"])
+    for name in ("Foo.mp4", "Foo.jpg", "Foo.info.json", "Foo.part2.mp4", "Foo.part2.jpg", "Foo.part2.info.json"):
+        (base / name).write_text("x", encoding="utf-8")
+
+    repo.create_download("foo1", "https://example.com/v/foo1", "best")
+    repo.update_fields("foo1", status="completed", media_local_path="Foo.mp4", thumbnail_local_path="Foo.jpg")
+    repo.create_download("foo2", "https://example.com/v/foo2", "best")
+    repo.update_fields("foo2", status="completed", media_local_path="Foo.part2.mp4")
+
+    assert client.delete("/api/jobs/foo1").status_code == 200
+
+    assert sorted(path.name for path in base.iterdir() if path.name.startswith("Foo")) == [
+        "Foo.part2.info.json",
+        "Foo.part2.jpg",
+        "Foo.part2.mp4",
+    ]
+
+
+def test_files_route_serves_nested_paths_and_rejects_escapes(app, client):
+    base = Path(app.config["BASE_DOWNLOAD_DIR"])
+    (base / "sub").mkdir()
+    (base / "sub" / "clip.mp4").write_bytes(b"video")
+
+    response = client.get("/files/sub/../sub/clip.mp4")
+    assert response.status_code == 200
+    assert response.data == b"video"
+
+    assert client.get("/files/sub/../../outside.mp4").status_code == 403
+
+
+def test_files_route_offloads_to_x_accel_redirect(app_factory):
+    app = app_factory({"FILES_X_ACCEL_REDIRECT_PREFIX": "/_protected/"})
+    base = Path(app.config["BASE_DOWNLOAD_DIR"])
+    (base / "My Clip [id1].mp4").write_bytes(b"video")
+
+    response = app.test_client().get("/files/My Clip [id1].mp4")
+
+    assert response.status_code == 200
+    assert response.headers["X-Accel-Redirect"] == "/_protected/My%20Clip%20%5Bid1%5D.mp4"
+    assert response.data == b""
+
+
+def test_safe_storage_path_rejects_symlink_escape(app, queue_manager, tmp_path):
+    base = Path(app.config["BASE_DOWNLOAD_DIR"])
+    outside = tmp_path / "outside.mp4"
+    outside.write_text("secret", encoding="utf-8")
+    (base / "link.mp4").symlink_to(outside)
+    (base / "inside.mp4").write_text("video", encoding="utf-8")
+
+    assert queue_manager._safe_storage_path("link.mp4") is None
+    assert queue_manager._safe_storage_path("../outside.mp4") is None
+    assert queue_manager._safe_storage_path("inside.mp4") == str((base / "inside.mp4").resolve())
+
+
+def test_files_route_rejects_symlink_escape(app, client, tmp_path):
+    base = Path(app.config["BASE_DOWNLOAD_DIR"])
+    outside = tmp_path / "outside-served.mp4"
+    outside.write_text("secret", encoding="utf-8")
+    (base / "served-link.mp4").symlink_to(outside)
+
+    response = client.get("/files/served-link.mp4")
+    assert response.status_code == 403
+    assert b"secret" not in response.data
+
+
+def test_files_route_supports_range_and_conditional_requests(app, client):
+    base = Path(app.config["BASE_DOWNLOAD_DIR"])
+    (base / "range.mp4").write_bytes(b"0123456789")
+
+    partial = client.get("/files/range.mp4", headers={"Range": "bytes=2-5"})
+    assert partial.status_code == 206
+    assert partial.data == b"2345"
+
+    etag = client.get("/files/range.mp4").headers["ETag"]
+    assert client.get("/files/range.mp4", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_to_relative_strips_base_prefix_and_rejects_outside_paths(app, queue_manager, tmp_path):
+    base = os.path.realpath(app.config["BASE_DOWNLOAD_DIR"])
+
+    assert queue_manager._to_relative(os.path.join(base, "sub", "clip.mp4")) == os.path.join("sub", "clip.mp4")
+    assert queue_manager._to_relative(base + "-other/clip.mp4") is None
+    assert queue_manager._to_relative(str(tmp_path / "elsewhere.mp4")) is None
+    assert queue_manager._to_relative("/clip.mp4") is None
+    assert queue_manager._to_relative("clip.mp4") == "clip.mp4"
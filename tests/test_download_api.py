@@ -1,3 +1,6 @@
+import json
+
+
 def test_download_creates_queued_row_with_default_preset(client, repo):
     response = client.post(
         "/download",
@@ -16,6 +19,20 @@ def test_download_creates_queued_row_with_default_preset(client, repo):
     assert row["status"] == "queued"
 
 
+def test_download_reuses_active_job_for_same_url_and_preset(client, repo):
+    url = "https://youtube.com/watch?v=dup123"
+    first = client.post("/download", data={"u": url}).get_json()
+    second = client.post("/download", data={"u": url}).get_json()
+    audio = client.post("/download", data={"u": url, "preset": "audio_only"}).get_json()
+
+    assert second["job_id"] == first["job_id"]
+    assert audio["job_id"] != first["job_id"]
+
+    repo.update_fields(first["job_id"], status="completed")
+    third = client.post("/download", data={"u": url}).get_json()
+    assert third["job_id"] != first["job_id"]
+
+
 def test_download_rejects_invalid_preset(client):
     response = client.post(
         "/download",
@@ -36,3 +53,99 @@ def test_presets_endpoint(client):
     assert payload["ok"] is True
     ids = {item["id"] for item in payload["presets"]}
     assert {"best", "best_1080p", "audio_only"}.issubset(ids)
+    assert payload["default"] == "best"
+
+
+def test_catch_all_repairs_collapsed_scheme_and_keeps_query(client, repo):
+    response = client.get("/https:/youtube.com/watch?v=catch1")
+    assert response.status_code == 200
+
+    payload = client.get("/api/jobs").get_json()
+    assert [item["requested_url"] for item in payload["items"]] == ["https://youtube.com/watch?v=catch1"]
+
+
+def test_unknown_paths_return_not_found(client):
+    assert client.get("/ftp:/example.com/file").status_code == 404
+    assert client.get("/gallery/extra").status_code == 404
+
+    api_response = client.get("/api/unknown")
+    assert api_response.status_code == 404
+    assert api_response.get_json() == {"ok": False, "error": "not_found"}
+
+
+def test_index_renders_preset_options(client):
+    body = client.get("/").data.decode("utf-8")
+
+    assert '<option value="best" selected>Best</option>' in body
+    assert '<option value="audio_only" >Audio only (M4A)</option>' in body
+
+
+def test_status_stream_emits_current_state_and_closes_on_terminal_status(client, repo):
+    repo.create_download("stream1", "https://youtube.com/watch?v=stream1", "best")
+    repo.update_fields("stream1", status="completed", title="Streamed")
+
+    response = client.get("/api/status/stream1/stream")
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    events = [chunk for chunk in response.data.decode("utf-8").split("\n\n") if chunk]
+    assert len(events) == 1
+    assert events[0].startswith("data: ")
+    payload = json.loads(events[0][len("data: "):])
+    assert payload["job"]["status"] == "completed"
+
+    assert client.get("/api/status/missing/stream").status_code == 404
+
+
+def test_jinja_bytecode_cache_is_opt_in(app_factory, tmp_path):
+    assert app_factory().jinja_env.bytecode_cache is None
+
+    cache_dir = tmp_path / "jinja-cache"
+    app = app_factory({"JINJA_BYTECODE_CACHE_DIR": str(cache_dir)})
+    assert app.jinja_env.bytecode_cache is not None
+    assert cache_dir.stat().st_mode & 0o077 == 0
+
+
+def test_create_download_always_inserts_the_requested_id(repo):
+    first = repo.create_download("plain-1", "https://example.com/v/same", "best")
+    second = repo.create_download("plain-2", "https://example.com/v/same", "best")
+
+    assert first["id"] == "plain-1"
+    assert second["id"] == "plain-2"
+
+
+def test_status_stream_limit_returns_429_and_releases_slots(app_factory):
+    app = app_factory({"STATUS_STREAM_MAX_CONNECTIONS": 1})
+    client = app.test_client()
+    repo = app.extensions["repo"]
+    repo.create_download("stream-cap", "https://youtube.com/watch?v=cap", "best")
+    repo.update_fields("stream-cap", status="completed")
+
+    held = client.get("/api/status/stream-cap/stream", buffered=False)
+    assert held.status_code == 200
+
+    refused = client.get("/api/status/stream-cap/stream")
+    assert refused.status_code == 429
+    assert refused.headers["Retry-After"] == "5"
+    assert refused.get_json()["poll"] == "/api/status/stream-cap"
+
+    held.close()
+    assert client.get("/api/status/stream-cap/stream").status_code == 200
+
+
+def test_status_stream_parses_metadata_only_for_emitted_events(client, repo, monkeypatch):
+    repo.create_download("stream-lean", "https://youtube.com/watch?v=lean", "best")
+    repo.update_fields("stream-lean", status="completed", metadata_json='{"id":"lean"}')
+    calls = []
+    original = repo.get_download
+
+    def _tracking(download_id, with_metadata=True):
+        calls.append(with_metadata)
+        return original(download_id, with_metadata)
+
+    monkeypatch.setattr(repo, "get_download", _tracking)
+    response = client.get("/api/status/stream-lean/stream")
+
+    payload = json.loads(response.data.decode("utf-8").split("\n\n")[0][len("data: "):])
+    assert payload["job"]["metadata"] == {"id": "lean"}
+    assert calls == [False, False, True]
@@ -1,19 +1,22 @@
-def _create_completed(repo, job_id, title, uploader):
-    repo.create_download(job_id, f"https://youtube.com/watch?v={job_id}", "best")
-    repo.update_fields(
-        job_id,
-        status="completed",
-        title=title,
-        uploader=uploader,
-        video_id=job_id,
-        media_local_path=f"{title} [{job_id}].mp4",
-    )
+def _completed_row(job_id, title, uploader):
+    return {
+        "id": job_id,
+        "requested_url": f"https://youtube.com/watch?v={job_id}",
+        "title": title,
+        "uploader": uploader,
+        "video_id": job_id,
+        "media_local_path": f"{title} [{job_id}].mp4",
+    }
+
 
+def _create_completed(insert_completed, job_id, title, uploader):
+    insert_completed([_completed_row(job_id, title, uploader)])
 
-def test_gallery_server_side_pagination_search_and_sort(client, repo):
-    _create_completed(repo, "id1", "Charlie", "Uploader C")
-    _create_completed(repo, "id2", "Alpha", "Uploader A")
-    _create_completed(repo, "id3", "Bravo", "Uploader B")
+
+def test_gallery_server_side_pagination_search_and_sort(client, insert_completed):
+    _create_completed(insert_completed, "id1", "Charlie", "Uploader C")
+    _create_completed(insert_completed, "id2", "Alpha", "Uploader A")
+    _create_completed(insert_completed, "id3", "Bravo", "Uploader B")
 
     page1 = client.get("/gallery?status=completed&sort=title_asc&page=1&per_page=2")
     body1 = page1.data.decode("utf-8")
@@ -38,3 +41,77 @@ def test_gallery_server_side_pagination_search_and_sort(client, repo):
     assert payload["total"] == 3
     assert len(payload["items"]) == 2
     assert payload["items"][0]["title"] == "Alpha"
+
+
+def test_uploader_filter_is_case_insensitive(client, insert_completed):
+    _create_completed(insert_completed, "id1", "Charlie", "Uploader C")
+    _create_completed(insert_completed, "id2", "Alpha", "Uploader A")
+
+    payload = client.get("/api/jobs?status=completed&uploader=uploader%20a").get_json()
+    assert payload["total"] == 1
+    assert payload["items"][0]["title"] == "Alpha"
+
+
+def test_search_matches_substrings_and_tracks_updates(client, repo, insert_completed):
+    _create_completed(insert_completed, "id1", "Charlie", "Uploader C")
+    _create_completed(insert_completed, "id2", "Alpha", "Uploader A")
+
+    payload = client.get("/api/jobs?status=completed&q=LPH").get_json()
+    assert [item["title"] for item in payload["items"]] == ["Alpha"]
+
+    repo.update_fields("id2", title="Omega")
+    assert client.get("/api/jobs?status=completed&q=lph").get_json()["total"] == 0
+    assert client.get("/api/jobs?status=completed&q=meg").get_json()["total"] == 1
+
+    short = client.get("/api/jobs?status=completed&q=ch").get_json()
+    assert [item["title"] for item in short["items"]] == ["Charlie"]
+
+
+def test_search_total_covers_all_pages(client, insert_completed):
+    insert_completed(
+        [_completed_row(f"srch{index}", f"Episode {index}", "Show") for index in range(5)]
+        + [_completed_row("other", "Unrelated", "Show")]
+    )
+
+    page = client.get("/api/jobs?status=completed&q=episode&page=2&per_page=2").get_json()
+    assert page["total"] == 5
+    assert len(page["items"]) == 2
+    assert "_total" not in page["items"][0]
+
+    past_end = client.get("/api/jobs?status=completed&q=episode&page=9&per_page=2").get_json()
+    assert past_end["total"] == 5
+    assert past_end["items"] == []
+
+
+def test_gallery_cache_refreshes_after_writes(client, repo, insert_completed):
+    _create_completed(insert_completed, "id1", "Charlie", "Uploader C")
+
+    first = client.get("/gallery?status=completed").data.decode("utf-8")
+    assert "Charlie" in first
+
+    repo.update_fields("id1", title="Delta")
+    second = client.get("/gallery?status=completed").data.decode("utf-8")
+    assert 'title="Delta"' in second
+    assert 'title="Charlie"' not in second
+
+
+def test_api_jobs_keyset_cursor_walks_all_rows(client, insert_completed):
+    assert insert_completed(
+        _completed_row(f"key{index}", f"Item {index}", "Uploader") for index in range(5)
+    ) == 5
+
+    expected = [item["id"] for item in client.get("/api/jobs?status=completed&per_page=10").get_json()["items"]]
+
+    seen = []
+    url = "/api/jobs?status=completed&per_page=2"
+    payload = client.get(url).get_json()
+    while True:
+        seen.extend(item["id"] for item in payload["items"])
+        assert payload["total"] == 5
+        if not payload["next_cursor"]:
+            break
+        payload = client.get(f"{url}&cursor={payload['next_cursor']}").get_json()
+
+    assert seen == expected
+    assert client.get("/api/jobs?cursor=not-a-cursor").status_code == 400
+    assert client.get("/api/jobs?sort=title_asc&per_page=1").get_json()["next_cursor"] is None
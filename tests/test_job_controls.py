@@ -46,3 +46,40 @@ def test_pause_active_job_sets_cancel_event(app, client, repo, queue_manager):
     assert payload["ok"] is True
     assert cancel_event.is_set() is True
     assert repo.get_download(job["id"])["status"] == "paused"
+
+
+def test_scheduler_runs_immediately_when_woken(monkeypatch, client, queue_manager):
+    passes = []
+    ran = threading.Event()
+
+    def _run_once():
+        passes.append(1)
+        ran.set()
+
+    monkeypatch.setattr(queue_manager, "run_once", _run_once)
+    queue_manager.start()
+    try:
+        assert ran.wait(1)
+        ran.clear()
+
+        client.post("/download", data={"u": "https://youtube.com/watch?v=wake1"})
+
+        assert ran.wait(1)
+        assert len(passes) == 2
+    finally:
+        queue_manager.stop()
+
+
+def test_run_once_registers_queued_jobs_in_one_pass(monkeypatch, client, queue_manager):
+    release = threading.Event()
+    monkeypatch.setattr(queue_manager, "_worker", lambda _job_id, _cancel: release.wait(2))
+
+    first = client.post("/download", data={"u": "https://youtube.com/watch?v=batch1"}).get_json()["job_id"]
+    second = client.post("/download", data={"u": "https://youtube.com/watch?v=batch2"}).get_json()["job_id"]
+
+    try:
+        queue_manager.run_once()
+        assert set(queue_manager._active) == {first, second}
+        assert queue_manager._start_jobs([first, second]) == []
+    finally:
+        release.set()
@@ -0,0 +1,71 @@
+import io
+import json
+import logging
+
+from app.logging_config import BufferedStreamHandler, JsonFormatter
+
+
+def _record(message: str) -> logging.LogRecord:
+    return logging.LogRecord("test", logging.INFO, __file__, 1, message, None, None)
+
+
+def test_buffered_handler_batches_until_threshold():
+    stream = io.StringIO()
+    handler = BufferedStreamHandler(stream, flush_every=3, flush_interval_s=60)
+    handler.setFormatter(JsonFormatter())
+
+    handler.emit(_record("one"))
+    handler.emit(_record("two"))
+    assert stream.getvalue() == ""
+
+    handler.emit(_record("three"))
+    lines = stream.getvalue().splitlines()
+    assert [json.loads(line)["message"] for line in lines] == ["one", "two", "three"]
+
+
+def test_buffered_handler_flush_writes_pending_records():
+    stream = io.StringIO()
+    handler = BufferedStreamHandler(stream, flush_every=100, flush_interval_s=60)
+    handler.setFormatter(JsonFormatter())
+
+    handler.emit(_record("pending"))
+    handler.flush()
+
+    assert json.loads(stream.getvalue())["message"] == "pending"
+
+
+def test_json_formatter_uses_record_timestamp_and_extras():
+    record = _record("hello")
+    record.created = 1767225600.25
+    record.job_id = "job-1"
+    record._private = "hidden"
+
+    payload = json.loads(JsonFormatter().format(record))
+
+    assert payload["ts"] == "2026-01-01T00:00:00.250000+00:00"
+    assert payload["job_id"] == "job-1"
+    assert "_private" not in payload
+    assert "msg" not in payload
+
+
+class Opaque:
+    def __str__(self):
+        return "opaque"
+
+
+def test_json_formatter_stringifies_unserializable_extras():
+    record = _record("hello")
+    record.payload = Opaque()
+
+    assert json.loads(JsonFormatter().format(record))["payload"] == "opaque"
+
+
+def test_json_formatter_keeps_records_with_big_ints_and_non_str_keys():
+    record = _record("hello")
+    record.view_count = 2**70
+    record.by_code = {404: "missing"}
+
+    payload = json.loads(JsonFormatter().format(record))
+
+    assert payload["view_count"] == 2**70
+    assert payload["by_code"] == {"404": "missing"}
@@ -20,6 +20,9 @@ def test_set_completed_serializes_non_json_metadata(repo):
             "uploader": "Creator",
             "webpage_url": "https://youtube.com/watch?v=job-meta",
             "postprocessor": NonSerializableValue(),
+            "formats": [{"format_id": "137", "url": "https://example.com/v"}],
+            "subtitles": {"en": [{"ext": "vtt"}]},
+            "view_count": 2**70,
         },
         media_local_path="Meta Test [job-meta].mp4",
         thumbnail_local_path="Meta Test [job-meta].jpg",
@@ -35,3 +38,71 @@ def test_set_completed_serializes_non_json_metadata(repo):
     parsed = json.loads(row["metadata_json"])
     assert parsed["id"] == "job-meta"
     assert parsed["postprocessor"] == "NonSerializableValue"
+    assert parsed["view_count"] == 2**70
+    assert "formats" not in parsed
+    assert "subtitles" not in parsed
+
+
+def test_set_completed_stores_compact_metadata_json(repo):
+    repo.create_download("job-compact", "https://youtube.com/watch?v=job-compact", "best")
+    repo.set_completed(
+        download_id="job-compact",
+        runtime_profile="primary",
+        attempt_current=1,
+        attempt_max=1,
+        info={"id": "job-compact", "title": "Überschrift", "tags": ["a", "b"]},
+        media_local_path=None,
+        thumbnail_local_path=None,
+    )
+
+    row = repo.get_download("job-compact")
+    assert row["metadata_json"] == '{"id":"job-compact","title":"Überschrift","tags":["a","b"]}'
+    assert row["metadata"]["title"] == "Überschrift"
+
+
+def test_corrupt_metadata_json_reads_back_as_none(repo):
+    repo.create_download("job-corrupt", "https://youtube.com/watch?v=job-corrupt", "best")
+    repo.update_fields("job-corrupt", metadata_json="{not json")
+
+    row = repo.get_download("job-corrupt")
+    assert row["metadata_json"] == "{not json"
+    assert row["metadata"] is None
+
+
+def test_set_completed_only_overwrites_reported_fields(repo):
+    repo.create_download("job-sparse", "https://example.com/v/sparse", "best")
+    repo.update_fields("job-sparse", title="Known title", error_message="earlier failure")
+
+    repo.set_completed(
+        download_id="job-sparse",
+        runtime_profile="primary",
+        attempt_current=1,
+        attempt_max=1,
+        info={"id": "sparse", "ext": "webm"},
+        media_local_path=None,
+        thumbnail_local_path=None,
+    )
+
+    row = repo.get_download("job-sparse")
+    assert row["status"] == "completed"
+    assert row["title"] == "Known title"
+    assert row["video_id"] == "sparse"
+    assert row["media_ext"] == "webm"
+    assert row["error_message"] is None
+
+
+def test_metadata_parse_can_be_skipped(repo, client):
+    repo.create_download("job-lean", "https://youtube.com/watch?v=job-lean", "best")
+    repo.update_fields("job-lean", metadata_json='{"id":"job-lean"}')
+
+    row = repo.get_download("job-lean", with_metadata=False)
+    assert row["metadata_json"] == '{"id":"job-lean"}'
+    assert "metadata" not in row
+
+    items, _ = repo.list_downloads(1, 10, None, None, "created_desc", None, with_metadata=False)
+    assert "metadata" not in items[0]
+
+    full = client.get("/api/jobs").get_json()["items"][0]
+    lean = client.get("/api/jobs?metadata=0").get_json()["items"][0]
+    assert full["metadata"] == {"id": "job-lean"}
+    assert "metadata" not in lean
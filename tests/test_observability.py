@@ -1,3 +1,8 @@
+import sqlite3
+
+import pytest
+
+
 def test_metrics_endpoint_exposes_expected_metrics(client):
     client.get("/healthz")
     client.post("/download", data={"u": "https://youtube.com/watch?v=metric1"})
@@ -32,3 +37,74 @@ def test_readyz_success_and_failure(client, repo, monkeypatch):
     assert failed_response.status_code == 503
     assert payload["ok"] is False
     assert "db_error" in payload["checks"]
+
+
+def test_readyz_probe_leaves_storage_version_unchanged(client, repo):
+    repo.create_download("ready-1", "https://example.com/v/ready", "best")
+    before = repo.storage_version()
+
+    assert client.get("/readyz").status_code == 200
+    assert repo.check_read_write() is True
+
+    assert repo.storage_version() == before
+    with repo.pool.reader() as connection:
+        assert connection.execute("SELECT COUNT(*) FROM _readyz_probe").fetchone()[0] == 0
+
+
+def test_readyz_probe_reports_write_failures(repo):
+    def _fail(connection):
+        connection.execute("INSERT INTO no_such_table VALUES (1)")
+
+    with pytest.raises(sqlite3.OperationalError):
+        repo.pool.probe_write(_fail)
+    assert repo.check_read_write() is True
+
+
+def test_metrics_recorder_reuses_bound_label_children():
+    from app.metrics import DOWNLOADER_JOBS_QUEUED_TOTAL, MetricsRecorder
+
+    recorder = MetricsRecorder()
+    child = DOWNLOADER_JOBS_QUEUED_TOTAL.labels(preset="metrics-child")
+    before = child._value.get()
+
+    recorder.mark_queued("metrics-child")
+    recorder.mark_queued("metrics-child")
+
+    assert recorder._queued[("metrics-child",)] is child
+    assert child._value.get() == before + 2
+
+
+def test_queue_depth_is_recounted_only_after_state_changes(client, repo, queue_manager, monkeypatch):
+    calls = []
+    count_queue_depth = repo.count_queue_depth
+    monkeypatch.setattr(repo, "count_queue_depth", lambda: calls.append(1) or count_queue_depth())
+
+    queue_manager._sync_metrics()
+    queue_manager._sync_metrics()
+    assert len(calls) == 1
+
+    client.post("/download", data={"u": "https://youtube.com/watch?v=depth1"})
+    queue_manager._sync_metrics()
+    assert len(calls) == 2
+
+
+def test_job_duration_histogram_uses_coarse_buckets(client):
+    from app.metrics import MetricsRecorder
+
+    MetricsRecorder().observe_duration("best", "completed", 120.0)
+    body = client.get("/metrics").data.decode("utf-8")
+
+    assert 'downloader_job_duration_seconds_bucket{le="7200.0",preset="best",status="completed"}' in body
+    assert 'downloader_job_duration_seconds_bucket{le="0.005"' not in body
+
+
+def test_metrics_body_is_reused_within_ttl(app_factory):
+    app = app_factory({"METRICS_CACHE_TTL_MS": 60_000})
+    client = app.test_client()
+
+    first = client.get("/metrics").data
+    app.extensions["metrics"].mark_queued("metrics-ttl")
+    second = client.get("/metrics").data
+
+    assert second == first
+    assert b"metrics-ttl" not in second
@@ -1,5 +1,9 @@
-import threading
 import json
+import os
+import threading
+from pathlib import Path
+
+import pytest
 
 
 class DummyPostprocessor:
@@ -8,6 +12,19 @@ class DummyPostprocessor:
 
 
 class FakeYoutubeDL:
+    DOWNLOADING = {
+        "status": "downloading",
+        "downloaded_bytes": 500,
+        "total_bytes": 1000,
+        "speed": 250,
+        "eta": 2,
+    }
+    FINISHED = {
+        "status": "finished",
+        "downloaded_bytes": 1000,
+        "total_bytes": 1000,
+    }
+
     def __init__(self, options):
         self.options = options
 
@@ -19,22 +36,8 @@ class FakeYoutubeDL:
 
     def extract_info(self, url, download=True):
         hook = self.options["progress_hooks"][0]
-        hook(
-            {
-                "status": "downloading",
-                "downloaded_bytes": 500,
-                "total_bytes": 1000,
-                "speed": 250,
-                "eta": 2,
-            }
-        )
-        hook(
-            {
-                "status": "finished",
-                "downloaded_bytes": 1000,
-                "total_bytes": 1000,
-            }
-        )
+        hook(self.DOWNLOADING)
+        hook(self.FINISHED)
         return {
             "id": "abc123",
             "title": "Video",
@@ -51,9 +54,13 @@ class FakeYoutubeDL:
         }
 
 
-def test_progress_hook_updates_job_state(monkeypatch, repo, queue_manager):
+@pytest.fixture
+def fake_ytdl(monkeypatch):
     monkeypatch.setattr("app.queue_manager.YoutubeDL", FakeYoutubeDL)
+    return FakeYoutubeDL
 
+
+def test_progress_hook_updates_job_state(fake_ytdl, repo, queue_manager):
     repo.create_download("job-progress", "https://youtube.com/watch?v=abc123", "best")
 
     info = queue_manager._download_with_progress(
@@ -75,8 +82,33 @@ def test_progress_hook_updates_job_state(monkeypatch, repo, queue_manager):
     assert info["postprocessor"] == "DummyPostprocessor()"
 
 
-def test_worker_completes_and_persists_serializable_metadata(monkeypatch, repo, queue_manager):
-    monkeypatch.setattr("app.queue_manager.YoutubeDL", FakeYoutubeDL)
+def test_finished_hook_flushes_before_postprocessing(monkeypatch, repo, queue_manager):
+    seen = {}
+
+    class PostprocessingYoutubeDL(FakeYoutubeDL):
+        def extract_info(self, url, download=True):
+            self.options["progress_hooks"][0](self.FINISHED)
+            seen["row"] = repo.get_download("job-finished")
+            return {"id": "abc123"}
+
+    monkeypatch.setattr("app.queue_manager.YoutubeDL", PostprocessingYoutubeDL)
+    repo.create_download("job-finished", "https://youtube.com/watch?v=abc123", "best")
+
+    queue_manager._download_with_progress(
+        job_id="job-finished",
+        url="https://youtube.com/watch?v=abc123",
+        preset="best",
+        attempt_no=1,
+        attempt_max=1,
+        runtime_profile="primary",
+        cancel_event=threading.Event(),
+    )
+
+    assert float(seen["row"]["progress_percent"]) == 100.0
+    assert int(seen["row"]["downloaded_bytes"]) == 1000
+
+
+def test_worker_completes_and_persists_serializable_metadata(fake_ytdl, monkeypatch, repo, queue_manager):
     monkeypatch.setattr(queue_manager, "_resolve_media_path", lambda _info: "Video [abc123].mp4")
     monkeypatch.setattr(queue_manager, "_resolve_thumbnail_path", lambda _media: "Video [abc123].jpg")
 
@@ -91,3 +123,137 @@ def test_worker_completes_and_persists_serializable_metadata(monkeypatch, repo,
     parsed = json.loads(row["metadata_json"])
     assert parsed["id"] == "abc123"
     assert parsed["postprocessor"] == "DummyPostprocessor()"
+
+
+def test_worker_skips_metadata_when_persistence_disabled(fake_ytdl, monkeypatch, repo, queue_manager):
+    monkeypatch.setattr(queue_manager, "persist_metadata", False)
+    monkeypatch.setattr(queue_manager, "_resolve_media_path", lambda _info: "Video [abc123].mp4")
+    monkeypatch.setattr(queue_manager, "_resolve_thumbnail_path", lambda _media: None)
+
+    def _no_sanitize(self, info_dict, remove_private_keys=False):
+        raise AssertionError("sanitize_info should not run without metadata persistence")
+
+    monkeypatch.setattr(fake_ytdl, "sanitize_info", _no_sanitize)
+    repo.create_download("job-lean-worker", "https://youtube.com/watch?v=abc123", "best")
+
+    queue_manager._worker("job-lean-worker", threading.Event())
+
+    row = repo.get_download("job-lean-worker")
+    assert row["status"] == "completed"
+    assert row["title"] == "Video"
+    assert row["metadata_json"] is None
+
+
+def test_update_progress_many_writes_all_rows_in_one_batch(repo):
+    repo.create_download("batch-1", "https://youtube.com/watch?v=batch1", "best")
+    repo.create_download("batch-2", "https://youtube.com/watch?v=batch2", "best")
+
+    updated = repo.update_progress_many(
+        [
+            (25.0, 250, 1000, 100.0, 7, "batch-1"),
+            (50.0, 500, 1000, 200.0, 3, "batch-2"),
+            (10.0, 10, 100, None, None, "missing"),
+        ]
+    )
+
+    assert updated == 2
+    assert float(repo.get_download("batch-1")["progress_percent"]) == 25.0
+    assert int(repo.get_download("batch-2")["downloaded_bytes"]) == 500
+
+
+def test_queued_progress_keeps_latest_tick_per_job(repo, queue_manager):
+    repo.create_download("coalesce-1", "https://youtube.com/watch?v=coalesce1", "best")
+
+    queue_manager._queue_progress("coalesce-1", 10.0, 100, 1000, None, None)
+    queue_manager._queue_progress("coalesce-1", 40.0, 400, 1000, None, None)
+    assert float(repo.get_download("coalesce-1")["progress_percent"]) == 0.0
+
+    assert queue_manager.flush_progress() == 1
+    assert int(repo.get_download("coalesce-1")["downloaded_bytes"]) == 400
+    assert queue_manager.flush_progress() == 0
+
+
+def test_ydl_options_use_configured_throughput_settings(queue_manager):
+    options = queue_manager._build_ydl_options("https://youtube.com/watch?v=abc123", "best", "primary", lambda _p: None)
+
+    assert options["concurrent_fragment_downloads"] == queue_manager.ytdlp_fragment_concurrency
+    assert options["buffersize"] == 64 * 1024
+    assert options["http_chunk_size"] == 10 * 1024 * 1024
+
+
+def test_ydl_options_copy_precomputed_template_per_call(queue_manager):
+    first = queue_manager._build_ydl_options("https://youtube.com/watch?v=abc123", "best", "fallback", lambda _p: None)
+    second = queue_manager._build_ydl_options("https://example.com/video", "unknown", "fallback", lambda _p: None)
+
+    assert first is not second
+    assert "extractor_args" in first
+    assert "extractor_args" not in second
+    assert second["format"] == queue_manager._build_ydl_options("https://example.com/v", "best", "primary", None)["format"]
+    assert first["progress_hooks"] is not second["progress_hooks"]
+
+
+def test_retry_delay_is_jittered_and_capped(queue_manager):
+    queue_manager.retry_base_s = 1.0
+    queue_manager.retry_max_s = 4.0
+
+    delays = [queue_manager._retry_delay(retry_no) for retry_no in range(1, 10) for _ in range(20)]
+
+    assert all(0 <= delay <= 4.0 for delay in delays)
+    assert all(0 <= queue_manager._retry_delay(1) <= 1.0 for _ in range(20))
+
+
+def test_ytdlp_retry_sleep_matches_retry_manager_call(monkeypatch, queue_manager):
+    from yt_dlp.utils import RetryManager
+
+    retry_numbers = []
+    slept = []
+
+    def _fixed_delay(retry_no):
+        retry_numbers.append(retry_no)
+        return 0.25 * retry_no
+
+    monkeypatch.setattr(queue_manager, "_retry_delay", _fixed_delay)
+    monkeypatch.setattr("yt_dlp.utils._utils.time.sleep", slept.append)
+    options = queue_manager._build_ydl_options("https://example.com/v", "best", "primary", None)
+
+    for kind in ("http", "fragment"):
+        for count in (1, 2):
+            RetryManager.report_retry(
+                OSError("boom"),
+                count,
+                3,
+                sleep_func=options["retry_sleep_functions"][kind],
+                info=lambda _msg: None,
+                warn=lambda _msg: None,
+            )
+
+    # report_retry passes n=count - 1; the adapter maps it to the 1-based retry number.
+    assert retry_numbers == [1, 2, 1, 2]
+    assert slept == [0.25, 0.5, 0.25, 0.5]
+
+
+def test_resolve_media_path_falls_back_to_newest_file_for_video_id(app, queue_manager):
+    base = Path(app.config["BASE_DOWNLOAD_DIR"])
+    (base / "Clip [vid42].info.json").write_text("{}", encoding="utf-8")
+    (base / "Clip [vid42].jpg").write_text("thumb", encoding="utf-8")
+    (base / "Clip [vid42].mp4.part").write_text("partial", encoding="utf-8")
+    (base / "Clip [v].mp4").write_text("other", encoding="utf-8")
+    older = base / "Clip [vid42].webm"
+    older.write_text("old", encoding="utf-8")
+    os.utime(older, (1_000_000, 1_000_000))
+    (base / "Clip [vid42].mp4").write_text("new", encoding="utf-8")
+
+    assert queue_manager._resolve_media_path({"id": "vid42"}) == "Clip [vid42].mp4"
+    assert queue_manager._resolve_media_path({"id": "missing"}) is None
+
+
+def test_retryable_and_failure_reason_matching(queue_manager):
+    assert queue_manager._is_retryable("HTTP Error 403: Forbidden", "primary", 1, 2)
+    assert queue_manager._is_retryable("ERROR: Missing a URL", "primary", 1, 2)
+    assert not queue_manager._is_retryable("HTTP Error 403", "fallback", 1, 2)
+    assert not queue_manager._is_retryable("Video unavailable", "primary", 1, 2)
+
+    assert queue_manager._failure_reason("Network error after HTTP Error 403") == "forbidden"
+    assert queue_manager._failure_reason("Network is unreachable") == "network"
+    assert queue_manager._failure_reason("This video is not available") == "unavailable"
+    assert queue_manager._failure_reason("boom") == "other"
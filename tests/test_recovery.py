@@ -12,3 +12,13 @@ def test_recovery_marks_stale_downloading_jobs_failed(app_factory):
     assert row is not None
     assert row["status"] == "failed"
     assert row["error_message"] == "interrupted_by_restart"
+
+
+def test_recovery_skips_the_write_when_nothing_is_stale(repo, monkeypatch):
+    repo.create_download("fresh1", "https://youtube.com/watch?v=fresh1", "best")
+
+    def _no_write(_op):
+        raise AssertionError("recovery should not queue a write")
+
+    monkeypatch.setattr(repo.pool, "write", _no_write)
+    assert repo.recover_interrupted_downloads() == 0